@@ -0,0 +1,270 @@
+"""
+数据访问层基准测试：在不同数据规模下测量各 func_* 查询/写入函数的单次耗时与SQL条数，
+并与保存的基线对比，发现性能回退
+
+用法（项目根目录下执行）:
+    python benchmarks/bench_func.py [--sizes 100,1000,10000] [--repeat 20]
+                                    [--database-uri sqlite:////tmp/bench_func.db]
+                                    [--save-baseline benchmarks/results/func_baseline.json]
+                                    [--baseline benchmarks/results/func_baseline.json] [--threshold 0.3]
+
+规模 N 表示：宝宝有 N 条尝试记录、用户有 N 条通知；食材、食谱（每个5个餐次）、事件数及
+用户所属家庭数为 N/10。每个规模都会重建全部表，--database-uri 指向MySQL时请使用单独的测试库。
+默认使用临时SQLite文件；SQLite与MySQL的绝对耗时不可比，基线应在同一环境下生成和对比。
+
+每次调用前清空会话（与每个请求使用新会话一致），耗时取多次调用的最小值。
+对比基线时，SQL条数增加、或耗时超过基线 (1 + threshold) 倍且多出 0.5ms 以上的记为回退，存在回退时退出码为1。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 基准测试不需要预热连接池，也不输出慢查询日志
+os.environ.setdefault('DB_PREWARM_CONNECTIONS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+import config  # noqa: E402
+from wxcloudrun import create_app, db  # noqa: E402
+from wxcloudrun.tables import (User, Family, FamilyMember, Baby, Ingredient, FoodTrial, Recipe,  # noqa: E402
+                               RecipeItem, Event, Notification)
+from wxcloudrun import func_baby, func_family, func_ingredient, func_recipe, func_event, meal_plan  # noqa: E402
+from seeding import MEAL_TYPES, ingredient_row, insert_rows, new_id  # noqa: E402
+
+# 耗时回退的最小绝对差（毫秒），避免极快的调用因噪声误报
+MIN_REGRESSION_MS = 0.5
+
+# 已执行的SQL语句数
+_statements = [0]
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _statements[0] += 1
+
+
+def seed(size):
+    """
+    重建表并写入规模为 size 的数据
+    :return: 基准用例使用的ID
+    """
+    db.drop_all()
+    db.create_all()
+    now = datetime.now()
+    today = date.today()
+    small = max(size // 10, 1)
+
+    user_id, baby_id = new_id(), new_id()
+    ingredients = [ingredient_row(i, now, nutrients={'protein': 1.0}, suitable_month_from=6, suitable_month_to=36)
+                   for i in range(small)]
+    families = [{'id': new_id(), 'name': '家庭{}'.format(i), 'created_by': user_id, 'created_at': now}
+                for i in range(small)]
+    members = [{'family_id': family['id'], 'user_id': user_id, 'role': 'admin', 'joined_at': now}
+               for family in families]
+    first_day = today - timedelta(days=size)
+    trials = [{'id': new_id(), 'baby_id': baby_id, 'ingredient_id': ingredients[i % small]['id'],
+               'trial_date': first_day + timedelta(days=i), 'trial_count': 1, 'is_allergic': False,
+               'reaction_level': 'none', 'notes': '', 'created_at': now} for i in range(size)]
+    recipes, items = [], []
+    for i in range(small):
+        recipe_id = new_id()
+        recipes.append({'id': recipe_id, 'baby_id': baby_id, 'recipe_date': today - timedelta(days=small - i),
+                        'created_by': user_id, 'auto_generated': True, 'notes': '', 'created_at': now})
+        items.extend({'id': new_id(), 'recipe_id': recipe_id, 'meal_type': meal_type,
+                      'ingredients': [{'id': ingredients[i % small]['id'], 'name': ingredients[i % small]['name']}],
+                      'instructions': '', 'created_at': now} for meal_type in MEAL_TYPES)
+    events = [{'id': new_id(), 'baby_id': baby_id, 'event_type': 'other', 'start_date': first_day + timedelta(days=i),
+               'end_date': first_day + timedelta(days=i), 'description': '', 'created_at': now}
+              for i in range(small)]
+    notifications = [{'id': new_id(), 'user_id': user_id, 'type': 'recipe_update', 'title': '通知{}'.format(i),
+                      'message': '', 'is_read': i % 4 != 0, 'created_at': now - timedelta(minutes=size - i)}
+                     for i in range(size)]
+
+    insert_rows(User, [{'id': user_id, 'nickname': '家长', 'avatar_url': '', 'created_at': now}])
+    for model, rows in [(Ingredient, ingredients), (Family, families), (FamilyMember, members)]:
+        insert_rows(model, rows)
+    insert_rows(Baby, [{'id': baby_id, 'family_id': families[0]['id'], 'nickname': '宝宝', 'gender': 'M',
+                        'birth_date': first_day - timedelta(days=180), 'avatar_url': '', 'avoid_ingredients': [],
+                        'created_at': now}])
+    for model, rows in [(FoodTrial, trials), (Recipe, recipes), (RecipeItem, items), (Event, events),
+                        (Notification, notifications)]:
+        insert_rows(model, rows)
+    func_ingredient.invalidate_ingredient_cache()
+
+    return {
+        'user_id': user_id,
+        'baby_id': baby_id,
+        'family_id': families[0]['id'],
+        'ingredient_id': ingredients[0]['id'],
+        'ingredient_count': small,
+        'last_recipe_day': today - timedelta(days=1),
+        'last_ingredient_key': [ingredients[-1]['category'], ingredients[-1]['name'], ingredients[-1]['id']],
+    }
+
+
+def without_cache(func):
+    """
+    关闭食材目录缓存后调用，测量数据库查询本身
+    """
+    def call(*args, **kwargs):
+        ttl = config.INGREDIENT_CACHE_TTL
+        config.INGREDIENT_CACHE_TTL = 0
+        try:
+            return func(*args, **kwargs)
+        finally:
+            config.INGREDIENT_CACHE_TTL = ttl
+    return call
+
+
+def build_cases(ids):
+    """
+    基准用例：(名称, 被测函数, 每次调用前生成参数的函数)
+    """
+    baby_id, user_id = ids['baby_id'], ids['user_id']
+    last_page = (ids['ingredient_count'] - 1) // 20 + 1
+    day = ids['last_recipe_day']
+
+    def food_trials():
+        trials = [FoodTrial(id=new_id(), baby_id=baby_id, ingredient_id=ids['ingredient_id'],
+                            trial_date=date.today(), trial_count=1) for _ in range(100)]
+        return (trials,)
+
+    def week_plan():
+        ingredients, _ = func_ingredient.query_eligible_ingredients(func_baby.query_baby_by_id(baby_id), date.today())
+        return baby_id, [(date.today() + timedelta(days=i), ingredients) for i in range(7)]
+
+    def single_event():
+        return (Event(id=new_id(), baby_id=baby_id, event_type='other', start_date=date.today(),
+                      end_date=date.today()),)
+
+    return [
+        ('query_ingredients[last page, db]', without_cache(func_ingredient.query_ingredients),
+         lambda: (last_page, 20)),
+        ('query_ingredients[last page, cache]', func_ingredient.query_ingredients, lambda: (last_page, 20)),
+        ('query_ingredients_after[deep cursor, db]', without_cache(func_ingredient.query_ingredients_after),
+         lambda: (ids['last_ingredient_key'][:2] + [''], 20)),
+        ('query_ingredient_by_id[db]', without_cache(func_ingredient.query_ingredient_by_id),
+         lambda: (ids['ingredient_id'],)),
+        ('query_food_trials_by_baby', func_ingredient.query_food_trials_by_baby, lambda: (baby_id,)),
+        ('query_trial_summary', func_ingredient.query_trial_summary, lambda: (baby_id,)),
+        ('query_eligible_ingredients[cache]', func_ingredient.query_eligible_ingredients,
+         lambda: (func_baby.query_baby_by_id(baby_id), date.today())),
+        ('query_eligible_ingredients[db]', without_cache(func_ingredient.query_eligible_ingredients),
+         lambda: (func_baby.query_baby_by_id(baby_id), date.today())),
+        ('query_recipes_by_baby', func_recipe.query_recipes_by_baby, lambda: (baby_id,)),
+        ('plan_recipes[7d, in memory]', meal_plan.plan_recipes, week_plan),
+        ('query_recipes_with_items_by_range[7d]', func_recipe.query_recipes_with_items_by_range,
+         lambda: (baby_id, day - timedelta(days=6), day)),
+        ('query_events_by_baby', func_event.query_events_by_baby, lambda: (baby_id,)),
+        ('query_user_families', func_family.query_user_families, lambda: (user_id,)),
+        ('query_family_members_with_users', func_family.query_family_members_with_users,
+         lambda: (ids['family_id'],)),
+        ('query_notifications_by_user', func_event.query_notifications_by_user, lambda: (user_id,)),
+        ('query_notifications_page[20]', func_event.query_notifications_page, lambda: (user_id,)),
+        ('query_unread_count', func_event.query_unread_count, lambda: (user_id,)),
+        ('insert_food_trials[100]', func_ingredient.insert_food_trials, food_trials),
+        ('insert_event', func_event.insert_event, single_event),
+    ]
+
+
+def measure(func, make_args, repeat):
+    """
+    :return: 单次调用最短耗时（毫秒）与SQL条数（取最后一次调用）
+    """
+    timings, statements = [], 0
+    for i in range(repeat + 1):
+        args = make_args()
+        db.session.remove()
+        before = _statements[0]
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        statements = _statements[0] - before
+        # 第一次调用用于预热（编译语句缓存、初始化计数行等），不计入结果
+        if i:
+            timings.append(elapsed * 1000)
+    db.session.remove()
+    return min(timings), statements
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线对比
+    :return: 回退说明列表
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append('{}: SQL {} -> {}'.format(key, base['queries'], current['queries']))
+        if current['ms'] > base['ms'] * (1 + threshold) and current['ms'] - base['ms'] > MIN_REGRESSION_MS:
+            regressions.append('{}: {:.2f}ms -> {:.2f}ms (+{:.0%})'.format(
+                key, base['ms'], current['ms'], current['ms'] / base['ms'] - 1))
+    return regressions
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    app = create_app()
+    database_uri = args.database_uri or 'sqlite:///{}'.format(os.path.join(tempfile.mkdtemp(), 'bench_func.db'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config.pop('SQLALCHEMY_BINDS', None)
+    if not database_uri.startswith('mysql'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    print('database: {}'.format(database_uri))
+
+    results, rows = {}, {}
+    with app.app_context():
+        for size in sizes:
+            start = time.perf_counter()
+            ids = seed(size)
+            print('seeded size {} in {:.1f}s'.format(size, time.perf_counter() - start))
+            for name, func, make_args in build_cases(ids):
+                ms, queries = measure(func, make_args, args.repeat)
+                results['{}@{}'.format(name, size)] = {'ms': round(ms, 4), 'queries': queries}
+                rows.setdefault(name, []).append((ms, queries))
+
+    # 每列一个数据规模，最后一列为最大规模相对最小规模的耗时倍数
+    header = '{:<44}'.format('function') + ''.join('{:>18}'.format('N={}'.format(size)) for size in sizes)
+    print(header + '{:>10}'.format('growth'))
+    for name, cells in rows.items():
+        line = '{:<44}'.format(name) + ''.join('{:>18}'.format('{:.2f}ms / {}q'.format(ms, q)) for ms, q in cells)
+        print(line + '{:>9.1f}x'.format(cells[-1][0] / cells[0][0]))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'database': database_uri.split(':', 1)[0], 'results': results}, f, indent=1)
+        print('baseline written to {}'.format(args.save_baseline))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('regressions against {}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            return 1
+        print('no regressions against {}'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='数据访问层基准测试')
+    parser.add_argument('--sizes', default='100,1000,10000', help='数据规模，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=20, help='每个用例的调用次数（取最小值）')
+    parser.add_argument('--database-uri', default='', help='数据库地址，默认使用临时SQLite文件（会重建全部表）')
+    parser.add_argument('--save-baseline', default='', help='将结果保存为基线文件')
+    parser.add_argument('--baseline', default='', help='与该基线文件对比')
+    parser.add_argument('--threshold', type=float, default=0.3, help='耗时超过基线多少比例记为回退')
+    sys.exit(run(parser.parse_args()))
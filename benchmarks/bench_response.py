@@ -0,0 +1,103 @@
+"""
+响应序列化基准测试：对比标准库json与orjson在最大的几个列表响应上的耗时
+
+用法（项目根目录下执行）:
+    python benchmarks/bench_response.py [--rows 2000] [--repeat 50]
+
+orjson已列入requirements.txt，未安装时只测试标准库json。
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wxcloudrun.response import get_serializer  # noqa: E402
+
+
+def build_food_trials(rows):
+    """
+    构造与 GET /api/babies/<id>/food-trials 相同结构的数据
+    """
+    baby_id = str(uuid.uuid4())
+    start = date(2024, 1, 1)
+    return [{
+        'id': str(uuid.uuid4()),
+        'baby_id': baby_id,
+        'ingredient_id': str(uuid.uuid4()),
+        'trial_date': start + timedelta(days=i % 700),
+        'trial_count': i % 5 + 1,
+        'is_allergic': i % 37 == 0,
+        'reaction_level': 'none' if i % 37 else 'mild',
+        'notes': '第{}次尝试，宝宝接受度良好'.format(i),
+        'created_at': datetime(2024, 1, 1, 8, 30, 0, 123000) + timedelta(hours=i)
+    } for i in range(rows)]
+
+
+def build_notifications(rows):
+    """
+    构造与 GET /api/users/<id>/notifications 相同结构的数据
+    """
+    user_id = str(uuid.uuid4())
+    return [{
+        'id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'type': ('trial_reminder', 'recipe_update', 'event_alert')[i % 3],
+        'title': '今日食谱已更新',
+        'message': '宝宝今天的辅食食谱已经生成，快去看看吧！',
+        'is_read': i % 4 != 0,
+        'created_at': datetime(2024, 1, 1, 9, 0, 0, 456000) + timedelta(hours=i)
+    } for i in range(rows)]
+
+
+def build_ingredients(rows):
+    """
+    构造与 GET /api/ingredients 相同结构的数据（含JSON列nutrients）
+    """
+    return [{
+        'id': str(uuid.uuid4()),
+        'name': '食材{}'.format(i),
+        'category': ('蔬菜', '水果', '谷物', '肉类')[i % 4],
+        'image_url': 'https://cdn.example.com/ingredients/{}.png'.format(i),
+        'risk_level': ('low', 'medium', 'high')[i % 3],
+        'nutrients': {'vitaminA': 25.1, 'fiber': 1.2, 'protein': 0.9, 'iron': 0.3},
+        'summary': '富含维生素，适合辅食添加初期',
+        'suitable_month_from': 6,
+        'suitable_month_to': 36
+    } for i in range(rows)]
+
+
+def run(rows, repeat):
+    payloads = {
+        'food_trials': build_food_trials(rows),
+        'notifications': build_notifications(rows),
+        'ingredients': build_ingredients(rows),
+    }
+    names = ['json', 'orjson']
+    serializers = {name: get_serializer(name) for name in names}
+    if serializers['orjson'] is serializers['json']:
+        names = ['json']
+        print('orjson 未安装，只测试标准库json')
+
+    print('{:<15}{:<10}{:>12}{:>12}{:>10}'.format('payload', 'encoder', 'ms/call', 'bytes', 'speedup'))
+    for payload_name, payload in payloads.items():
+        data = {'code': 0, 'data': payload}
+        baseline = None
+        for name in names:
+            dumps = serializers[name]
+            elapsed = min(timeit.repeat(lambda: dumps(data), number=1, repeat=repeat))
+            size = len(dumps(data))
+            baseline = baseline or elapsed
+            print('{:<15}{:<10}{:>12.3f}{:>12}{:>9.1f}x'.format(
+                payload_name, name, elapsed * 1000, size, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='响应序列化基准测试')
+    parser.add_argument('--rows', type=int, default=2000, help='每个列表的行数')
+    parser.add_argument('--repeat', type=int, default=50, help='重复次数（取最小值）')
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
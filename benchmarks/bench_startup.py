@@ -0,0 +1,97 @@
+"""
+冷启动基准测试：在全新的Python进程中测量 导入 -> 创建应用 -> 完成首个请求 各阶段耗时
+
+用法（项目根目录下执行）:
+    python benchmarks/bench_startup.py [--runs 10] [--path /api/ingredients] [--imports]
+
+每次测量都启动独立的子进程，模拟实例从0扩容后的启动过程。
+默认使用内存SQLite库并建表，不依赖MySQL；传入 --database-uri 可测试真实数据库（含建连耗时）。
+--imports 输出导入耗时最多的模块（python -X importtime），用于定位拖慢启动的依赖。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程中执行的测量脚本
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import wxcloudrun
+imported = time.perf_counter()
+app = wxcloudrun.create_app()
+created = time.perf_counter()
+uri = sys.argv[2]
+if uri.startswith('sqlite'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app.config['SQLALCHEMY_BINDS'] = {}
+    with app.app_context():
+        wxcloudrun.db.create_all()
+elif uri:
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+ready = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - ready,
+    'total': served - start - (ready - created),
+    'status': response.status_code,
+}))
+'''
+
+PHASES = ['import', 'create_app', 'first_request', 'total']
+
+
+def probe(path, database_uri):
+    env = dict(os.environ, DB_PREWARM_CONNECTIONS='0')
+    output = subprocess.check_output([sys.executable, '-c', _PROBE, path, database_uri], cwd=ROOT, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def show_imports(top):
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import wxcloudrun'],
+                            cwd=ROOT, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL).stderr.decode('utf-8')
+    # 输出按后序排列（子模块在前），模块名前的缩进（每层2个空格）表示导入层级
+    rows, pending = [], {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        children = pending.pop(depth + 1, [])
+        if name.strip() == 'wxcloudrun':
+            rows = children
+        pending.setdefault(depth, []).append((int(cumulative_us), name.strip()))
+    print('\nwxcloudrun 直接导入的模块中耗时最多的:')
+    for cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print('{:<30}{:>10.1f} ms'.format(name, cumulative_us / 1000))
+
+
+def run(runs, path, database_uri, imports):
+    results = [probe(path, database_uri) for _ in range(runs)]
+    statuses = {result['status'] for result in results}
+    print('GET {} -> HTTP {}，共 {} 次'.format(path, ', '.join(str(s) for s in sorted(statuses)), runs))
+    print('{:<16}{:>12}{:>12}{:>12}'.format('phase', 'min ms', 'median ms', 'max ms'))
+    for phase in PHASES:
+        values = [result[phase] * 1000 for result in results]
+        print('{:<16}{:>12.1f}{:>12.1f}{:>12.1f}'.format(
+            phase, min(values), statistics.median(values), max(values)))
+    if imports:
+        show_imports(15)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='冷启动基准测试')
+    parser.add_argument('--runs', type=int, default=10, help='启动次数')
+    parser.add_argument('--path', default='/api/ingredients', help='首个请求的路径')
+    parser.add_argument('--database-uri', default='sqlite://', help='数据库地址，空字符串表示使用config.py中的MySQL')
+    parser.add_argument('--imports', action='store_true', help='输出导入耗时最多的模块')
+    args = parser.parse_args()
+    run(args.runs, args.path, args.database_uri, args.imports)
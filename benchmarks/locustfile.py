@@ -0,0 +1,112 @@
+"""
+接口压测脚本（Locust），覆盖小程序的主要使用路径：
+登录、查看一周食谱、食材选择器（按分类浏览、翻页）、轮询通知
+
+准备（项目根目录下执行）:
+    pip install locust
+    # 1. 本地MySQL（或任意兼容实例）并写入种子数据
+    docker run -d --name baby-meal-mysql -p 3306:3306 -e MYSQL_ROOT_PASSWORD=root -e MYSQL_DATABASE=baby_meal mysql:8.0
+    python benchmarks/seed.py --families 50 --years 1 --out seed_data.json
+    # 2. 微信接口桩服务
+    python benchmarks/wechat_stub.py --port 9090
+    # 3. 被测服务（与生产相同的 gunicorn 配置）
+    WECHAT_API_BASE=http://127.0.0.1:9090 SERVER_BIND=127.0.0.1:8080 gunicorn -c gunicorn.conf.py wxcloudrun:app
+
+运行（无界面，结果按接口输出 p50/p95/p99 耗时与吞吐量，并写入CSV作为基线）:
+    SEED_FILE=seed_data.json locust -f benchmarks/locustfile.py --headless -u 50 -r 10 -t 3m \\
+        --host http://127.0.0.1:8080 --csv benchmarks/results/baseline
+
+同一组参数（种子数据规模、并发用户数、时长）前后各跑一次，对比 *_stats.csv 即可判断性能变化。
+"""
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+
+from locust import HttpUser, between, events, task
+
+_seed = {}
+
+
+@events.init.add_listener
+def _load_seed(environment, **kwargs):
+    with open(os.environ.get('SEED_FILE', 'seed_data.json'), encoding='utf-8') as f:
+        _seed.update(json.load(f))
+
+
+@events.quitting.add_listener
+def _print_percentiles(environment, **kwargs):
+    """
+    结束时按接口输出 p50/p95/p99 与吞吐量
+    """
+    stats = environment.stats
+    print('{:<52}{:>8}{:>8}{:>8}{:>8}{:>10}{:>8}'.format('endpoint', 'reqs', 'fails', 'p50', 'p95', 'p99', 'rps'))
+    for entry in sorted(stats.entries.values(), key=lambda e: (e.name, e.method)):
+        print('{:<52}{:>8}{:>8}{:>8}{:>8}{:>10}{:>8.1f}'.format(
+            '{} {}'.format(entry.method, entry.name), entry.num_requests, entry.num_failures,
+            entry.get_response_time_percentile(0.5), entry.get_response_time_percentile(0.95),
+            entry.get_response_time_percentile(0.99), entry.total_rps))
+
+
+class ParentUser(HttpUser):
+    """
+    一位家长：登录后反复查看食谱、挑选食材并轮询通知
+    """
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        family = random.choice(_seed['families'])
+        self.user_id = random.choice(family['user_ids'])
+        self.baby_id = random.choice(family['baby_ids'])
+        self.last_poll = None
+        self.login()
+
+    def _check(self, response):
+        # 业务错误（code != 0）也计为失败
+        if response.status_code != 200 or response.json().get('code') != 0:
+            response.failure('code={} body={}'.format(response.status_code, response.text[:200]))
+            return None
+        return response.json()['data']
+
+    @task(1)
+    def login(self):
+        # 桩服务把 code 原样作为 openid 返回，命中种子数据中的用户
+        with self.client.post('/api/auth/login', json={'code': self.user_id},
+                              name='/api/auth/login', catch_response=True) as response:
+            self._check(response)
+
+    @task(4)
+    def weekly_recipes(self):
+        last_day = date.fromisoformat(_seed['last_day'])
+        first_day = date.fromisoformat(_seed['first_day'])
+        start = first_day + timedelta(days=random.randint(0, max((last_day - first_day).days - 6, 0)))
+        with self.client.get('/api/babies/{}/recipes/range'.format(self.baby_id),
+                             params={'from': start.isoformat(), 'to': (start + timedelta(days=6)).isoformat()},
+                             name='/api/babies/<baby_id>/recipes/range', catch_response=True) as response:
+            self._check(response)
+
+    @task(4)
+    def ingredient_picker(self):
+        # 按分类浏览，向后翻两页
+        params = {'category': random.choice(_seed['categories']), 'page_size': 20, 'after': ''}
+        for _ in range(2):
+            with self.client.get('/api/ingredients', params=params,
+                                 name='/api/ingredients?category&after', catch_response=True) as response:
+                data = self._check(response)
+            if not data or not data.get('next_cursor'):
+                break
+            params['after'] = data['next_cursor']
+
+    @task(6)
+    def poll_notifications(self):
+        with self.client.get('/api/users/{}/notifications/unread-count'.format(self.user_id),
+                             name='/api/users/<user_id>/notifications/unread-count',
+                             catch_response=True) as response:
+            self._check(response)
+        params = {'limit': 20}
+        if self.last_poll:
+            params['since'] = self.last_poll
+        with self.client.get('/api/users/{}/notifications'.format(self.user_id), params=params,
+                             name='/api/users/<user_id>/notifications', catch_response=True) as response:
+            self._check(response)
+        self.last_poll = datetime.now().isoformat()
@@ -0,0 +1,41 @@
+"""
+种子数据公共部分，供 seed.py（压测数据）与 bench_func.py（基准测试数据）共用：
+ID生成、食材分类与命名、分批写入；餐别直接取自 wxcloudrun.tables，与表结构保持一致
+"""
+import uuid
+
+from wxcloudrun import db
+from wxcloudrun.tables import MEAL_TYPES  # noqa: F401
+
+CATEGORIES = ['谷物', '蔬菜', '水果', '肉类', '鱼虾', '蛋奶', '豆类', '坚果']
+
+# 每批插入的行数
+CHUNK_SIZE = 1000
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+def ingredient_row(index, now, **fields):
+    """
+    构造一行食材数据（分类按序号轮换，名称为分类加序号）
+    :param index: 序号
+    :param now: 更新时间
+    :param fields: 覆盖的字段
+    """
+    category = CATEGORIES[index % len(CATEGORIES)]
+    row = {'id': new_id(), 'name': '{}{}'.format(category, index), 'category': category, 'image_url': '',
+           'risk_level': 'low', 'nutrients': {}, 'summary': '', 'description': '',
+           'suitable_month_from': None, 'suitable_month_to': None, 'updated_at': now}
+    row.update(fields)
+    return row
+
+
+def insert_rows(model, rows):
+    """
+    分批执行多行INSERT
+    """
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
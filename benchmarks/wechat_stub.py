@@ -0,0 +1,52 @@
+"""
+微信接口桩服务：压测时代替 api.weixin.qq.com，避免真实调用及频率限制
+
+用法（项目根目录下执行）:
+    python benchmarks/wechat_stub.py [--port 9090] [--latency-ms 30]
+
+服务启动时设置 WECHAT_API_BASE=http://127.0.0.1:9090 即可使用。
+jscode2session 直接把 code 作为 openid 返回，压测脚本用种子数据中的用户ID作为 code，登录命中已有用户。
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class WechatStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 模拟微信接口的网络及处理耗时（秒）
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/sns/jscode2session' and query.get('js_code'):
+            status, data = 200, {'openid': query['js_code'][0], 'session_key': 'stub_session_key'}
+        else:
+            status, data = 200, {'errcode': 40029, 'errmsg': 'invalid code'}
+
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='微信接口桩服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=9090, help='监听端口')
+    parser.add_argument('--latency-ms', type=float, default=30, help='模拟的接口耗时（毫秒）')
+    args = parser.parse_args()
+    WechatStubHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), WechatStubHandler)
+    print('wechat stub listening on http://{}:{}'.format(args.host, args.port))
+    server.serve_forever()
@@ -1,13 +1,92 @@
 import os
 
-# 是否开启debug模式
-DEBUG = True
+# 是否开启debug模式（生产环境请保持关闭，本地调试可设置 DEBUG=true）
+DEBUG = os.environ.get("DEBUG", 'false').lower() == 'true'
 
 # 读取数据库环境变量
 username = os.environ.get("MYSQL_USERNAME", 'root')
 password = os.environ.get("MYSQL_PASSWORD", 'root')
 db_address = os.environ.get("MYSQL_ADDRESS", '127.0.0.1:3306')
+# 只读库地址（可选），配置后只读查询发往只读库，账号密码与主库相同
+db_read_address = os.environ.get("MYSQL_READ_ADDRESS", '')
+
+# 数据库连接池配置（每个worker进程）
+# 常驻连接数与允许临时超出的连接数
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+# 连接池耗尽时等待空闲连接的时间（秒）
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# 连接最长使用时间（秒），需小于MySQL的wait_timeout，避免使用已被服务端关闭的空闲连接
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 280))
+# 取出连接前先ping一次，实例缩容到0后恢复或连接被服务端断开时自动重连
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", 'true').lower() == 'true'
+# 建立连接、读取、写入超时（秒）
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", 5))
+DB_READ_TIMEOUT = int(os.environ.get("DB_READ_TIMEOUT", 15))
+DB_WRITE_TIMEOUT = int(os.environ.get("DB_WRITE_TIMEOUT", 15))
+# worker启动时在后台预先建立的连接数（0表示不预热），缩容到0后首个请求无需等待建连
+DB_PREWARM_CONNECTIONS = int(os.environ.get("DB_PREWARM_CONNECTIONS", 1))
 
 # 微信小程序配置 
 WECHAT_APPID = os.environ.get("WECHAT_APPID", 'wx1cf97f5a388d7690')
 WECHAT_SECRET = os.environ.get("WECHAT_SECRET", 'b9a3632f9516137d5ed6fd0a3722b4a2')
+
+# 微信接口调用配置（连接池复用、超时、重试与熔断）
+# 接口地址，本地压测/调试时可指向桩服务
+WECHAT_API_BASE = os.environ.get("WECHAT_API_BASE", 'https://api.weixin.qq.com')
+# 是否校验HTTPS证书
+WECHAT_VERIFY_SSL = os.environ.get("WECHAT_VERIFY_SSL", 'false').lower() == 'true'
+# 连接超时与读取超时（秒）
+WECHAT_CONNECT_TIMEOUT = float(os.environ.get("WECHAT_CONNECT_TIMEOUT", 2))
+WECHAT_READ_TIMEOUT = float(os.environ.get("WECHAT_READ_TIMEOUT", 5))
+# 连接池大小（每个worker进程）
+WECHAT_POOL_SIZE = int(os.environ.get("WECHAT_POOL_SIZE", 10))
+# 连接失败或5xx时的最大重试次数及退避系数（秒）
+WECHAT_MAX_RETRIES = int(os.environ.get("WECHAT_MAX_RETRIES", 2))
+WECHAT_RETRY_BACKOFF = float(os.environ.get("WECHAT_RETRY_BACKOFF", 0.2))
+# 熔断：连续失败多少次后熔断，熔断多少秒后放行试探请求
+WECHAT_BREAKER_FAILURES = int(os.environ.get("WECHAT_BREAKER_FAILURES", 5))
+WECHAT_BREAKER_RESET = float(os.environ.get("WECHAT_BREAKER_RESET", 30))
+
+# 食材目录缓存最长使用时间（秒），到期后重新加载，0表示关闭缓存
+INGREDIENT_CACHE_TTL = int(os.environ.get("INGREDIENT_CACHE_TTL", 300))
+# 食材目录版本戳（行数 + 最大更新时间）校验间隔（秒），其他worker/实例的修改最多延迟这么久可见
+INGREDIENT_CACHE_CHECK_INTERVAL = float(os.environ.get("INGREDIENT_CACHE_CHECK_INTERVAL", 2))
+
+# 应用日志（'log'）级别，输出到标准输出
+LOG_LEVEL = os.environ.get("LOG_LEVEL", 'DEBUG' if DEBUG else 'INFO').upper()
+
+# 是否为每个请求输出一行结构化日志（接口、状态码、耗时、SQL条数与耗时），需 LOG_LEVEL 为 INFO 或更低
+REQUEST_LOG = os.environ.get("REQUEST_LOG", 'true').lower() == 'true'
+
+# 慢查询阈值（毫秒），超过时输出SQL、参数结构及发起查询的 func_* 函数，0表示关闭
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 200))
+# 是否对慢查询执行 EXPLAIN 并记录执行计划（默认随DEBUG开启，测试/预发环境可单独开启）
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", str(DEBUG)).lower() == 'true'
+
+# GET /metrics 访问令牌（请求头 Authorization: Bearer <令牌>），为空时不开放该接口
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", '')
+# /metrics 输出的实例标签（instance），默认取容器主机名，为空时不加该标签
+METRICS_INSTANCE = os.environ.get("METRICS_INSTANCE", os.environ.get("HOSTNAME", ''))
+# 多worker指标文件目录（gunicorn 启动时清空），各worker的指标汇总后由 /metrics 输出
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", '/tmp/prometheus_multiproc')
+
+# 响应JSON序列化器：auto（优先使用orjson，未安装时使用标准库json）、orjson、json
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", 'auto')
+
+# WSGI服务配置（gunicorn，见 gunicorn.conf.py）
+# 监听地址
+SERVER_BIND = os.environ.get("SERVER_BIND", '0.0.0.0:80')
+# worker进程数（容器内cpu_count可能返回宿主机核数，因此按容器规格显式配置）
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 2))
+# 每个worker的线程数
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+# HTTP keep-alive 保持时间（秒）
+SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", 5))
+# 请求处理超时时间（秒），超时的worker会被重启
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 30))
+# 优雅重启/退出时等待处理中请求完成的时间（秒）
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+# worker处理多少个请求后自动平滑重启（0表示不重启），抖动值用于错开各worker的重启时间
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", 10000))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", 1000))
@@ -0,0 +1,45 @@
+# gunicorn 生产环境启动配置
+# 启动命令: gunicorn -c gunicorn.conf.py wxcloudrun:app
+# 所有参数均可通过环境变量调整，见 config.py
+import os
+import shutil
+
+# 以别名导入：gunicorn 会把配置文件中与其设置同名的变量（config）当作设置项读取
+import config as app_config
+
+bind = app_config.SERVER_BIND
+
+# 多进程 + 多线程（gthread）模型
+worker_class = 'gthread'
+workers = app_config.SERVER_WORKERS
+threads = app_config.SERVER_THREADS
+
+keepalive = app_config.SERVER_KEEPALIVE
+timeout = app_config.SERVER_TIMEOUT
+graceful_timeout = app_config.SERVER_GRACEFUL_TIMEOUT
+
+# 平滑重启worker，避免长时间运行的内存增长
+max_requests = app_config.SERVER_MAX_REQUESTS
+max_requests_jitter = app_config.SERVER_MAX_REQUESTS_JITTER
+
+# 日志输出到标准输出，配合云托管 customLogs: stdout
+accesslog = '-'
+errorlog = '-'
+loglevel = 'debug' if app_config.DEBUG else 'info'
+
+# 多进程指标：各worker把指标写入同一目录，/metrics 汇总所有worker后输出
+# 需在worker导入应用（prometheus_client）之前设置
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', app_config.METRICS_MULTIPROC_DIR)
+
+
+def on_starting(server):
+    # 清空上次运行遗留的指标文件，避免计数器从旧值继续累加
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    # worker退出（含 max_requests 平滑重启）后清理其当前值指标，累计值保留
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,24 +1,101 @@
+import logging
+import sys
+
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 import pymysql
 import config
+from wxcloudrun.pool import TimedQueuePool
+from wxcloudrun.routing import REPLICA_BIND, RoutingSQLAlchemy
 
 # 因MySQLDB不支持Python3，使用pymysql扩展库代替MySQLDB库
 pymysql.install_as_MySQLdb()
 
-# 初始化web应用
-app = Flask(__name__, instance_relative_config=True)
-app.config['DEBUG'] = config.DEBUG
+# 初始化DB操作对象（在 create_app 中绑定应用）
+# 提交后不让对象过期：会话随请求结束，写入后构造响应无需再查一次数据库
+db = RoutingSQLAlchemy(session_options={'expire_on_commit': False})
+
+
+def _init_logging():
+    """
+    应用日志（'log'）输出到标准输出，配合云托管 customLogs: stdout 采集
+    只输出消息本身，结构化日志每行都是完整的JSON；重复创建应用时不重复添加handler
+    """
+    logger = logging.getLogger('log')
+    logger.setLevel(config.LOG_LEVEL)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def create_app():
+    """
+    创建并配置web应用
+    :return: Flask应用
+    """
+    _init_logging()
+
+    app = Flask(__name__, instance_relative_config=True)
+    app.config['DEBUG'] = config.DEBUG
+
+    # 设定数据库链接
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://{}:{}@{}/baby_meal'.format(config.username, config.password,
+                                                                                 config.db_address)
+
+    # 只读库（可选），只读查询按 wxcloudrun.routing 的规则路由
+    if config.db_read_address:
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: 'mysql://{}:{}@{}/baby_meal'.format(config.username, config.password,
+                                                              config.db_read_address)
+        }
+
+    # 数据库连接池配置（主库与只读库相同）
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+        'pool_recycle': config.DB_POOL_RECYCLE,
+        'pool_pre_ping': config.DB_POOL_PRE_PING,
+        'connect_args': {
+            'connect_timeout': config.DB_CONNECT_TIMEOUT,
+            'read_timeout': config.DB_READ_TIMEOUT,
+            'write_timeout': config.DB_WRITE_TIMEOUT,
+        },
+    }
+
+    db.init_app(app)
+
+    # 加载控制器
+    from wxcloudrun.views import bp
+    app.register_blueprint(bp)
+
+    # 请求耗时与SQL统计
+    from wxcloudrun import instrumentation
+    instrumentation.init_app(app)
+
+    # 注册数据库迁移及运维命令
+    from wxcloudrun import migrations, commands
+    migrations.init_app(app)
+    commands.init_app(app)
+
+    # 加载配置
+    app.config.from_object('config')
 
-# 设定数据库链接
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://{}:{}@{}/baby_meal'.format(config.username, config.password,
-                                                                             config.db_address)
+    # 后台预先建立数据库连接，缩容到0后首个请求无需等待建连
+    if config.DB_PREWARM_CONNECTIONS > 0:
+        from wxcloudrun.pool import prewarm
+        prewarm(app, config.DB_PREWARM_CONNECTIONS)
 
-# 初始化DB操作对象
-db = SQLAlchemy(app)
+    return app
 
-# 加载控制器
-from wxcloudrun import views
 
-# 加载配置
-app.config.from_object('config')
+def __getattr__(name):
+    """
+    兼容 `wxcloudrun:app` 与 `from wxcloudrun import app`：首次访问时才创建应用
+    """
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
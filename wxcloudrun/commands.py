@@ -0,0 +1,14 @@
+import click
+
+from wxcloudrun.func_event import reconcile_unread_counters
+
+
+def init_app(app):
+    """
+    注册运维命令
+    """
+    @app.cli.command('reconcile-unread')
+    def reconcile_unread_command():
+        """按通知表修正用户未读计数"""
+        fixed = reconcile_unread_counters()
+        click.echo('reconciled {} unread counters'.format(fixed))
@@ -1,13 +1,19 @@
 import logging
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from wxcloudrun import db
+from wxcloudrun.routing import replica_read
 from wxcloudrun.tables import Baby
+from wxcloudrun.transaction import commit, rollback
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 宝宝允许通过PATCH更新的字段
+_BABY_UPDATE_FIELDS = ('nickname', 'gender', 'birth_date', 'avatar_url', 'avoid_ingredients')
+
 
 # ==================== 宝宝表相关操作 ====================
+@replica_read
 def query_baby_by_id(baby_id):
     """
     根据ID查询宝宝实体
@@ -21,6 +27,23 @@ def query_baby_by_id(baby_id):
         return None
 
 
+@replica_read
+def query_existing_baby_ids(baby_ids):
+    """
+    批量查询存在的宝宝ID（一次查询，用于批量写入前校验外键）
+    :param baby_ids: 宝宝ID集合
+    :return: 其中存在的宝宝ID集合，查询失败时返回None
+    """
+    if not baby_ids:
+        return set()
+    try:
+        return {row.id for row in db.session.query(Baby.id).filter(Baby.id.in_(baby_ids))}
+    except OperationalError as e:
+        logger.info("query_existing_baby_ids errorMsg= {} ".format(e))
+        return None
+
+
+@replica_read
 def query_babies_by_family(family_id):
     """
     根据家庭ID查询宝宝列表
@@ -41,41 +64,35 @@ def insert_baby(baby):
     """
     try:
         db.session.add(baby)
-        db.session.commit()
+        commit()
         return True
-    except OperationalError as e:
+    except (OperationalError, IntegrityError) as e:
         logger.info("insert_baby errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 def update_baby(baby_id, data):
     """
-    更新宝宝信息
+    更新宝宝信息（单条带条件的UPDATE，不预先查询）
     :param baby_id: 宝宝ID
     :param data: 更新数据字典
+    :return: 更新后的Baby实体，宝宝不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _BABY_UPDATE_FIELDS if key in data}
     try:
-        baby = query_baby_by_id(baby_id)
-        if baby is None:
-            return False
-        
-        if 'nickname' in data:
-            baby.nickname = data['nickname']
-        if 'gender' in data:
-            baby.gender = data['gender']
-        if 'birth_date' in data:
-            baby.birth_date = data['birth_date']
-        if 'avatar_url' in data:
-            baby.avatar_url = data['avatar_url']
-        if 'avoid_ingredients' in data:
-            baby.avoid_ingredients = data['avoid_ingredients']
-            
-        db.session.commit()
-        return True
+        if values:
+            updated = Baby.query.filter(Baby.id == baby_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        baby = Baby.query.get(baby_id)
+        commit()
+        return baby
     except OperationalError as e:
         logger.info("update_baby errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -89,10 +106,10 @@ def delete_baby(baby_id):
         if baby is None:
             return False
         db.session.delete(baby)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_baby errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
@@ -1,13 +1,24 @@
 import logging
-from sqlalchemy.exc import OperationalError
+import uuid
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, or_, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
 from wxcloudrun import db
-from wxcloudrun.tables import Event, Notification
+from wxcloudrun.routing import replica_read
+from wxcloudrun.tables import Baby, Event, FamilyMember, Notification, NotificationCounter
+from wxcloudrun.transaction import commit, rollback
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 事件允许通过PATCH更新的字段
+_EVENT_UPDATE_FIELDS = ('event_type', 'start_date', 'end_date', 'description')
+
 
 # ==================== 事件表相关操作 ====================
+@replica_read
 def query_event_by_id(event_id):
     """
     根据ID查询事件实体
@@ -21,6 +32,7 @@ def query_event_by_id(event_id):
         return None
 
 
+@replica_read
 def query_events_by_baby(baby_id):
     """
     根据宝宝ID查询事件列表
@@ -34,6 +46,30 @@ def query_events_by_baby(baby_id):
         return []
 
 
+@replica_read
+def query_events_in_range(baby_id, date_from, date_to, event_type=None):
+    """
+    查询与日期范围有交集的事件（未设置结束日期的事件只占开始当天）
+    :param baby_id: 宝宝ID
+    :param date_from: 开始日期（包含）
+    :param date_to: 结束日期（包含）
+    :param event_type: 事件类型筛选
+    :return: Event列表
+    """
+    try:
+        query = Event.query.filter(
+            Event.baby_id == baby_id,
+            Event.start_date <= date_to,
+            or_(Event.end_date >= date_from, and_(Event.end_date.is_(None), Event.start_date >= date_from))
+        )
+        if event_type:
+            query = query.filter(Event.event_type == event_type)
+        return query.order_by(Event.start_date).all()
+    except OperationalError as e:
+        logger.info("query_events_in_range errorMsg= {} ".format(e))
+        return []
+
+
 def insert_event(event):
     """
     插入一个事件实体
@@ -41,39 +77,50 @@ def insert_event(event):
     """
     try:
         db.session.add(event)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("insert_event errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
+        return False
+
+
+def insert_events(events):
+    """
+    批量插入事件（单次事务，同类实体的INSERT会合并为批量执行）
+    :param events: Event实体列表
+    """
+    try:
+        db.session.add_all(events)
+        commit()
+        return True
+    except (OperationalError, IntegrityError) as e:
+        logger.info("insert_events errorMsg= {} ".format(e))
+        rollback()
         return False
 
 
 def update_event(event_id, data):
     """
-    更新事件信息
+    更新事件信息（单条带条件的UPDATE，不预先查询）
     :param event_id: 事件ID
     :param data: 更新数据字典
+    :return: 更新后的Event实体，事件不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _EVENT_UPDATE_FIELDS if key in data}
     try:
-        event = query_event_by_id(event_id)
-        if event is None:
-            return False
-        
-        if 'event_type' in data:
-            event.event_type = data['event_type']
-        if 'start_date' in data:
-            event.start_date = data['start_date']
-        if 'end_date' in data:
-            event.end_date = data['end_date']
-        if 'description' in data:
-            event.description = data['description']
-            
-        db.session.commit()
-        return True
+        if values:
+            updated = Event.query.filter(Event.id == event_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        event = Event.query.get(event_id)
+        commit()
+        return event
     except OperationalError as e:
         logger.info("update_event errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -87,15 +134,16 @@ def delete_event(event_id):
         if event is None:
             return False
         db.session.delete(event)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_event errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 # ==================== 通知表相关操作 ====================
+@replica_read
 def query_notification_by_id(notification_id):
     """
     根据ID查询通知实体
@@ -109,6 +157,7 @@ def query_notification_by_id(notification_id):
         return None
 
 
+@replica_read
 def query_notifications_by_user(user_id, is_read=None):
     """
     根据用户ID查询通知列表
@@ -126,6 +175,40 @@ def query_notifications_by_user(user_id, is_read=None):
         return []
 
 
+@replica_read
+def query_notifications_page(user_id, is_read=None, after=None, since=None, limit=20):
+    """
+    分页查询用户通知（按创建时间倒序的游标分页）
+    :param user_id: 用户ID
+    :param is_read: 是否已读（None表示查询全部）
+    :param after: 上一页最后一条通知的排序键 (created_at, id)，None表示第一页
+    :param since: 只查询该时间之后创建的通知（增量同步），None表示不限制
+    :param limit: 每页数量
+    :return: Notification列表和下一页排序键（没有更多数据时为None）
+    """
+    try:
+        query = Notification.query.filter(Notification.user_id == user_id)
+        if is_read is not None:
+            query = query.filter(Notification.is_read == is_read)
+        if since is not None:
+            query = query.filter(Notification.created_at > since)
+        if after is not None:
+            query = query.filter(tuple_(Notification.created_at, Notification.id) < tuple_(*after))
+
+        # 多取一条用于判断是否还有下一页
+        notifications = query.order_by(Notification.created_at.desc(), Notification.id.desc()) \
+            .limit(limit + 1).all()
+        next_after = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            next_after = (last.created_at, last.id)
+        return notifications, next_after
+    except OperationalError as e:
+        logger.info("query_notifications_page errorMsg= {} ".format(e))
+        return [], None
+
+
 def insert_notification(notification):
     """
     插入一个通知实体
@@ -133,29 +216,72 @@ def insert_notification(notification):
     """
     try:
         db.session.add(notification)
-        db.session.commit()
+        db.session.flush()
+        if not notification.is_read:
+            _adjust_unread_count(notification.user_id, 1)
+        commit()
         return True
     except OperationalError as e:
         logger.info("insert_notification errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
+def insert_family_notifications(baby_id, notification_type, title, message):
+    """
+    向宝宝所在家庭的全部成员发送通知（单条多行INSERT，单次事务）
+    :param baby_id: 宝宝ID
+    :param notification_type: 通知类型
+    :param title: 标题
+    :param message: 内容
+    :return: 发送的通知数，失败时返回None
+    """
+    try:
+        user_ids = [row.user_id for row in db.session.query(FamilyMember.user_id)
+                    .join(Baby, Baby.family_id == FamilyMember.family_id)
+                    .filter(Baby.id == baby_id).all()]
+        if not user_ids:
+            return 0
+
+        created_at = datetime.now()
+        db.session.execute(Notification.__table__.insert().values([{
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'type': notification_type,
+            'title': title,
+            'message': message,
+            'is_read': False,
+            'created_at': created_at
+        } for user_id in user_ids]))
+        _adjust_unread_counts(user_ids, 1)
+        commit()
+        return len(user_ids)
+    except OperationalError as e:
+        logger.info("insert_family_notifications errorMsg= {} ".format(e))
+        rollback()
+        return None
+
+
 def mark_notification_read(notification_id):
     """
-    标记通知为已读
+    标记通知为已读（带未读条件的UPDATE，只有实际从未读变为已读时才减少未读计数，并发重复标记不会多减）
     :param notification_id: 通知ID
     """
     try:
-        notification = query_notification_by_id(notification_id)
-        if notification is None:
+        user_id = db.session.query(Notification.user_id).filter(Notification.id == notification_id).scalar()
+        if user_id is None:
             return False
-        notification.is_read = True
-        db.session.commit()
+        updated = Notification.query.filter(
+            Notification.id == notification_id,
+            Notification.is_read == False  # noqa: E712
+        ).update({Notification.is_read: True}, synchronize_session='evaluate')
+        if updated == 1:
+            _adjust_unread_count(user_id, -1)
+        commit()
         return True
     except OperationalError as e:
         logger.info("mark_notification_read errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -166,28 +292,146 @@ def mark_all_notifications_read(user_id):
     """
     try:
         Notification.query.filter(Notification.user_id == user_id).update({Notification.is_read: True})
-        db.session.commit()
+        NotificationCounter.query.filter(NotificationCounter.user_id == user_id) \
+            .update({NotificationCounter.unread_count: 0}, synchronize_session=False)
+        commit()
         return True
     except OperationalError as e:
         logger.info("mark_all_notifications_read errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 def delete_notification(notification_id):
     """
-    删除通知
+    删除通知（先按未读条件删除，删除了未读通知时才减少未读计数）
     :param notification_id: 通知ID
     """
     try:
-        notification = Notification.query.get(notification_id)
-        if notification is None:
+        user_id = db.session.query(Notification.user_id).filter(Notification.id == notification_id).scalar()
+        if user_id is None:
             return False
-        db.session.delete(notification)
-        db.session.commit()
-        return True
+        deleted = Notification.query.filter(
+            Notification.id == notification_id,
+            Notification.is_read == False  # noqa: E712
+        ).delete(synchronize_session='evaluate')
+        if deleted == 1:
+            _adjust_unread_count(user_id, -1)
+        else:
+            deleted = Notification.query.filter(Notification.id == notification_id) \
+                .delete(synchronize_session='evaluate')
+        commit()
+        return deleted == 1
     except OperationalError as e:
         logger.info("delete_notification errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
+
+# ==================== 未读通知计数相关操作 ====================
+def _adjust_unread_count(user_id, delta):
+    """
+    在当前事务中调整用户未读计数（不提交，计数不会小于0）
+    计数行不存在时不做处理，首次读取时再按实际未读数初始化
+    :param user_id: 用户ID
+    :param delta: 变化量
+    """
+    _adjust_unread_counts([user_id], delta)
+
+
+def _adjust_unread_counts(user_ids, delta):
+    """
+    在当前事务中批量调整多个用户的未读计数（单条UPDATE）
+    :param user_ids: 用户ID列表
+    :param delta: 变化量
+    """
+    new_count = NotificationCounter.unread_count + delta
+    NotificationCounter.query.filter(NotificationCounter.user_id.in_(user_ids)).update(
+        {NotificationCounter.unread_count: case((new_count < 0, 0), else_=new_count)},
+        synchronize_session=False)
+
+
+def _init_unread_counter(user_id):
+    """
+    按实际未读数初始化计数行（单条 INSERT ... SELECT COUNT(*)，计数行已存在时保持原值）
+    InnoDB 在默认的 REPEATABLE READ 隔离级别下对 INSERT ... SELECT 读到的通知加共享锁，与并发写入通知的事务串行：
+    先提交的通知会被计入，后写入的通知等待本事务提交后再对计数行加一，不会丢失
+    :param user_id: 用户ID
+    """
+    table = NotificationCounter.__table__
+    unread = select(literal(user_id), func.count(Notification.id), literal(datetime.now())).where(
+        Notification.user_id == user_id,
+        Notification.is_read == False  # noqa: E712
+    )
+    columns = ('user_id', 'unread_count', 'updated_at')
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql_insert(table).from_select(columns, unread)
+        stmt = stmt.on_duplicate_key_update(unread_count=table.c.unread_count)
+    else:
+        stmt = sqlite_insert(table).from_select(columns, unread).on_conflict_do_nothing()
+    db.session.execute(stmt)
+
+
+def query_unread_count(user_id):
+    """
+    查询用户未读通知数（读取计数表，计数行不存在时按实际未读数初始化）
+    :param user_id: 用户ID
+    :return: 未读通知数
+    """
+    try:
+        counter = NotificationCounter.query.get(user_id)
+        if counter is not None:
+            return counter.unread_count
+        _init_unread_counter(user_id)
+        unread_count = db.session.query(NotificationCounter.unread_count) \
+            .filter(NotificationCounter.user_id == user_id).scalar()
+        commit()
+        return unread_count or 0
+    except OperationalError as e:
+        logger.info("query_unread_count errorMsg= {} ".format(e))
+        rollback()
+        return 0
+
+
+# 修正未读计数时每批处理的用户数
+_RECONCILE_BATCH_SIZE = 1000
+
+
+def reconcile_unread_counters():
+    """
+    按通知表实际未读数修正计数表中的偏差
+    按 user_id 分批，每批一条 UPDATE（SET 与 WHERE 中按用户关联子查询统计未读数，走通知表的组合索引），
+    统计与修正在同一条语句中完成，不会把先读出的旧值写回；每批单独提交，避免长事务
+    :return: 被修正的计数行数
+    """
+    table = NotificationCounter.__table__
+    unread = select(func.count(Notification.id)).where(
+        Notification.user_id == table.c.user_id,
+        Notification.is_read == False  # noqa: E712
+    ).scalar_subquery()
+    fixed = 0
+    last_user_id = ''
+    try:
+        while True:
+            # 本批最后一个用户ID，为None时表示剩余用户不足一批
+            upper = db.session.query(NotificationCounter.user_id) \
+                .filter(NotificationCounter.user_id > last_user_id) \
+                .order_by(NotificationCounter.user_id) \
+                .offset(_RECONCILE_BATCH_SIZE - 1).limit(1).scalar()
+            in_batch = table.c.user_id > last_user_id
+            if upper is not None:
+                in_batch = and_(in_batch, table.c.user_id <= upper)
+            result = db.session.execute(table.update().where(in_batch, table.c.unread_count != unread)
+                                        .values(unread_count=unread, updated_at=datetime.now()))
+            commit()
+            if result.rowcount:
+                logger.info("reconcile_unread_counters fixed {} counters up to user_id= {}".format(
+                    result.rowcount, upper))
+            fixed += result.rowcount
+            if upper is None:
+                return fixed
+            last_user_id = upper
+    except OperationalError as e:
+        logger.info("reconcile_unread_counters errorMsg= {} ".format(e))
+        rollback()
+        return fixed
@@ -1,13 +1,19 @@
 import logging
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from wxcloudrun import db
-from wxcloudrun.tables import Family, FamilyMember
+from wxcloudrun.routing import replica_read
+from wxcloudrun.tables import Family, FamilyMember, User
+from wxcloudrun.transaction import commit, rollback
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 家庭允许更新的字段
+_FAMILY_UPDATE_FIELDS = ('name',)
+
 
 # ==================== 家庭表相关操作 ====================
+@replica_read
 def query_family_by_id(family_id):
     """
     根据ID查询家庭实体
@@ -28,30 +34,35 @@ def insert_family(family):
     """
     try:
         db.session.add(family)
-        db.session.commit()
+        commit()
         return True
-    except OperationalError as e:
+    except (OperationalError, IntegrityError) as e:
         logger.info("insert_family errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
-def update_family(family_id, name):
+def update_family(family_id, data):
     """
-    更新家庭信息
+    更新家庭信息（单条带条件的UPDATE，不预先查询）
     :param family_id: 家庭ID
-    :param name: 家庭名称
+    :param data: 更新数据字典
+    :return: 更新后的Family实体，家庭不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _FAMILY_UPDATE_FIELDS if key in data}
     try:
-        family = query_family_by_id(family_id)
-        if family is None:
-            return False
-        family.name = name
-        db.session.commit()
-        return True
+        if values:
+            updated = Family.query.filter(Family.id == family_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        family = Family.query.get(family_id)
+        commit()
+        return family
     except OperationalError as e:
         logger.info("update_family errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -65,15 +76,16 @@ def delete_family(family_id):
         if family is None:
             return False
         db.session.delete(family)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_family errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 # ==================== 家庭成员表相关操作 ====================
+@replica_read
 def query_family_members(family_id):
     """
     查询家庭成员列表
@@ -87,6 +99,23 @@ def query_family_members(family_id):
         return []
 
 
+@replica_read
+def query_family_members_with_users(family_id):
+    """
+    查询家庭成员列表及对应的用户信息（单次联表查询）
+    :param family_id: 家庭ID
+    :return: (FamilyMember, User) 元组列表
+    """
+    try:
+        return db.session.query(FamilyMember, User) \
+            .join(User, User.id == FamilyMember.user_id) \
+            .filter(FamilyMember.family_id == family_id).all()
+    except OperationalError as e:
+        logger.info("query_family_members_with_users errorMsg= {} ".format(e))
+        return []
+
+
+@replica_read
 def query_family_member(family_id, user_id):
     """
     查询家庭成员
@@ -111,11 +140,11 @@ def insert_family_member(member):
     """
     try:
         db.session.add(member)
-        db.session.commit()
+        commit()
         return True
-    except OperationalError as e:
+    except (OperationalError, IntegrityError) as e:
         logger.info("insert_family_member errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -130,14 +159,15 @@ def delete_family_member(family_id, user_id):
         if member is None:
             return False
         db.session.delete(member)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_family_member errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
+@replica_read
 def query_user_families(user_id):
     """
     查询用户所属的所有家庭
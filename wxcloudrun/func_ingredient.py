@@ -1,19 +1,217 @@
+import bisect
 import logging
-from sqlalchemy.exc import OperationalError
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+import config
 from wxcloudrun import db
+from wxcloudrun.routing import replica_read
 from wxcloudrun.tables import Ingredient, FoodTrial
+from wxcloudrun.transaction import commit, rollback, on_commit
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 食材允许通过PATCH更新的字段
+_INGREDIENT_UPDATE_FIELDS = ('name', 'category', 'image_url', 'risk_level', 'nutrients', 'summary', 'description',
+                             'suitable_month_from', 'suitable_month_to')
+
+# 食材尝试记录允许更新的字段
+_FOOD_TRIAL_UPDATE_FIELDS = ('trial_date', 'trial_count', 'is_allergic', 'reaction_level', 'notes')
+
+# 反应等级由轻到重，汇总时取最重的一级
+_REACTION_LEVELS = ('none', 'mild', 'moderate', 'severe')
+
+# 过敏风险等级由低到高
+_RISK_LEVELS = ('low', 'medium', 'high')
+
+
+# ==================== 食材目录缓存 ====================
+def _catalog_sort_key(category, name, ingredient_id):
+    """
+    食材目录排序键（NULL分类排在最前，与数据库 ORDER BY category, name, id 一致）
+    """
+    return category is not None, category or '', name or '', ingredient_id
+
+
+def _catalog_order_columns():
+    """
+    数据库查询食材目录时使用的排序列 (category, name, id)，由索引 idx_ingredients_catalog 提供顺序
+    MySQL 中 category、name 使用二进制排序规则（见迁移4），与Python字符串比较一致，
+    保证缓存与数据库两条路径的排序相同，缓存过期前后翻页不会跳过或重复记录（SQLite默认即按码点比较）
+    """
+    return Ingredient.category, Ingredient.name, Ingredient.id
+
+
+def _keyset_after(columns, values):
+    """
+    游标分页条件 (columns) > (values)
+    展开为 c1 >= v1 AND (c1 > v1 OR (c2 >= v2 AND ...))，首列为范围条件，可直接在组合索引上定位，
+    不依赖数据库对行构造器比较的优化
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return and_(column >= value, or_(column > value, _keyset_after(columns[1:], values[1:])))
+
+
+def _suitable_for_month(ingredient, month):
+    """
+    食材是否适用于该月龄（未设置起止月龄时视为不限）
+    """
+    return (ingredient.suitable_month_from or 0) <= month and \
+        (ingredient.suitable_month_to is None or month <= ingredient.suitable_month_to)
+
+
+class _CatalogSnapshot(object):
+    """
+    食材目录快照（只读），包含按ID索引和按分类预先排好序的列表
+    """
+
+    def __init__(self, ingredients, version):
+        ingredients = sorted(ingredients, key=lambda i: _catalog_sort_key(i.category, i.name, i.id))
+        self.version = version
+        self.by_id = {ingredient.id: ingredient for ingredient in ingredients}
+        self.by_category = {}
+        for ingredient in ingredients:
+            self.by_category.setdefault(ingredient.category, []).append(ingredient)
+        self.all = ingredients
+        self.all_keys = [_catalog_sort_key(i.category, i.name, i.id) for i in ingredients]
+        self.keys_by_category = {}
+        for category, items in self.by_category.items():
+            self.keys_by_category[category] = [_catalog_sort_key(i.category, i.name, i.id) for i in items]
+
+        # 月龄区间索引：按所有食材的起止月龄把月龄轴切成若干区间，
+        # 每个区间内适用的食材集合相同，查询时二分定位区间即可
+        bounds = {0}
+        for ingredient in ingredients:
+            bounds.add(ingredient.suitable_month_from or 0)
+            if ingredient.suitable_month_to is not None:
+                bounds.add(ingredient.suitable_month_to + 1)
+        self.month_bounds = sorted(bounds)
+        self.by_month_range = [[i for i in ingredients if _suitable_for_month(i, month)]
+                               for month in self.month_bounds]
+
+    def suitable(self, month):
+        """
+        获取适用于某个月龄的食材列表（按目录顺序）
+        """
+        index = bisect.bisect_right(self.month_bounds, month) - 1
+        return self.by_month_range[index] if index >= 0 else []
+
+    def ingredients(self, category=None):
+        """
+        获取全部或某个分类下的食材列表及对应排序键
+        """
+        if category:
+            return self.by_category.get(category, []), self.keys_by_category.get(category, [])
+        return self.all, self.all_keys
+
+
+class _IngredientCatalog(object):
+    """
+    进程内食材目录缓存（读穿透）
+    本进程写入时立即失效；其他worker/实例的写入通过版本戳（行数 + 最大更新时间）发现：
+    每隔 INGREDIENT_CACHE_CHECK_INTERVAL 秒查询一次版本戳，变化时重新加载，
+    因此其他进程写入后最多约 INGREDIENT_CACHE_CHECK_INTERVAL 秒（另加只读库复制延迟）可见；
+    INGREDIENT_CACHE_TTL 为快照最长使用时间，到期后无论版本是否变化都重新加载
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0
+        self._checked_at = 0
+
+    def _fresh(self, snapshot):
+        return snapshot is not None and \
+            time.monotonic() - self._checked_at < config.INGREDIENT_CACHE_CHECK_INTERVAL
+
+    def get(self):
+        """
+        获取当前有效的目录快照，缓存关闭或数据库异常时返回None
+        """
+        ttl = config.INGREDIENT_CACHE_TTL
+        if ttl <= 0:
+            return None
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        # 已有快照时由一个线程校验版本，其他线程继续使用当前快照，不排队等待
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot
+            now = time.monotonic()
+            version = _query_catalog_version()
+            if snapshot is None or snapshot.version != version or now - self._loaded_at >= ttl:
+                snapshot = _CatalogSnapshot(_load_catalog(), version)
+                self._snapshot = snapshot
+                self._loaded_at = now
+            self._checked_at = now
+            return snapshot
+        except OperationalError as e:
+            logger.info("ingredient_catalog errorMsg= {} ".format(e))
+            return None
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """
+        使缓存失效，下次读取时重新加载
+        """
+        with self._lock:
+            self._snapshot = None
+            self._loaded_at = 0
+            self._checked_at = 0
+
+
+_catalog = _IngredientCatalog()
+
+
+@replica_read
+def _query_catalog_version():
+    """
+    查询食材目录版本戳（行数 + 最大更新时间）
+    """
+    count, updated_at = db.session.query(func.count(Ingredient.id), func.max(Ingredient.updated_at)).one()
+    return count, updated_at
+
+
+@replica_read
+def _load_catalog():
+    """
+    加载全部食材并从会话中分离，便于跨请求复用
+    """
+    ingredients = Ingredient.query.all()
+    for ingredient in ingredients:
+        db.session.expunge(ingredient)
+    return ingredients
+
+
+def invalidate_ingredient_cache():
+    """
+    使食材目录缓存失效
+    """
+    _catalog.invalidate()
+
 
 # ==================== 食材表相关操作 ====================
+@replica_read
 def query_ingredient_by_id(ingredient_id):
     """
-    根据ID查询食材实体
+    根据ID查询食材实体（优先读取目录缓存）
+    注意：缓存中的实体已从会话分离，修改食材请直接查询数据库
     :param ingredient_id: 食材ID
     :return: Ingredient实体
     """
+    snapshot = _catalog.get()
+    if snapshot is not None and ingredient_id in snapshot.by_id:
+        return snapshot.by_id[ingredient_id]
     try:
         return Ingredient.query.filter(Ingredient.id == ingredient_id).first()
     except OperationalError as e:
@@ -21,6 +219,33 @@ def query_ingredient_by_id(ingredient_id):
         return None
 
 
+@replica_read
+def query_ingredients_by_ids(ingredient_ids):
+    """
+    批量查询食材（优先读取目录缓存，未命中的食材一次查询）
+    :param ingredient_ids: 食材ID列表
+    :return: 食材ID到Ingredient实体的字典（不存在的ID不包含在内）
+    """
+    ingredients = {}
+    missing = set(ingredient_ids)
+    snapshot = _catalog.get()
+    if snapshot is not None:
+        for ingredient_id in ingredient_ids:
+            if ingredient_id in snapshot.by_id:
+                ingredients[ingredient_id] = snapshot.by_id[ingredient_id]
+        missing -= set(ingredients)
+    if not missing:
+        return ingredients
+    try:
+        for ingredient in Ingredient.query.filter(Ingredient.id.in_(missing)).all():
+            ingredients[ingredient.id] = ingredient
+        return ingredients
+    except OperationalError as e:
+        logger.info("query_ingredients_by_ids errorMsg= {} ".format(e))
+        return ingredients
+
+
+@replica_read
 def query_ingredients(page=1, page_size=20, category=None):
     """
     查询食材列表（分页）
@@ -29,19 +254,80 @@ def query_ingredients(page=1, page_size=20, category=None):
     :param category: 分类筛选
     :return: 食材列表和总数
     """
+    snapshot = _catalog.get()
+    if snapshot is not None:
+        ingredients, _ = snapshot.ingredients(category)
+        start = (page - 1) * page_size
+        return ingredients[start:start + page_size], len(ingredients)
     try:
         query = Ingredient.query
         if category:
             query = query.filter(Ingredient.category == category)
         
         total = query.count()
-        ingredients = query.offset((page - 1) * page_size).limit(page_size).all()
+        ingredients = query.order_by(*_catalog_order_columns()) \
+            .offset((page - 1) * page_size).limit(page_size).all()
         return ingredients, total
     except OperationalError as e:
         logger.info("query_ingredients errorMsg= {} ".format(e))
         return [], 0
 
 
+@replica_read
+def query_ingredients_after(after=None, page_size=20, category=None, with_total=False):
+    """
+    查询食材列表（游标分页，按 category, name, id 排序）
+    :param after: 上一页最后一条记录的排序键 [category, name, id]，None表示第一页
+    :param page_size: 每页数量
+    :param category: 分类筛选
+    :param with_total: 是否同时查询总数
+    :return: 食材列表、下一页排序键（没有更多数据时为None）和总数（未查询时为None）
+    """
+    snapshot = _catalog.get()
+    if snapshot is not None:
+        ingredients, keys = snapshot.ingredients(category)
+        start = bisect.bisect_right(keys, _catalog_sort_key(*after)) if after is not None else 0
+        page = ingredients[start:start + page_size]
+        next_after = None
+        if start + page_size < len(ingredients):
+            last = page[-1]
+            next_after = [last.category, last.name, last.id]
+        return page, next_after, len(ingredients) if with_total else None
+    try:
+        query = Ingredient.query
+        if category:
+            query = query.filter(Ingredient.category == category)
+
+        total = query.count() if with_total else None
+
+        category_column, name_column, id_column = _catalog_order_columns()
+        if after is not None:
+            after_category, after_name, after_id = after
+            if after_category is None:
+                # NULL分类排在最前，游标位于NULL分类内时需单独处理
+                query = query.filter(or_(
+                    Ingredient.category.isnot(None),
+                    and_(Ingredient.category.is_(None),
+                         _keyset_after((name_column, id_column), (after_name, after_id)))
+                ))
+            else:
+                query = query.filter(_keyset_after((category_column, name_column, id_column),
+                                                   (after_category, after_name, after_id)))
+
+        # 多取一条用于判断是否还有下一页
+        ingredients = query.order_by(category_column, name_column, id_column) \
+            .limit(page_size + 1).all()
+        next_after = None
+        if len(ingredients) > page_size:
+            ingredients = ingredients[:page_size]
+            last = ingredients[-1]
+            next_after = [last.category, last.name, last.id]
+        return ingredients, next_after, total
+    except OperationalError as e:
+        logger.info("query_ingredients_after errorMsg= {} ".format(e))
+        return [], None, None
+
+
 def insert_ingredient(ingredient):
     """
     插入一个食材实体
@@ -49,49 +335,39 @@ def insert_ingredient(ingredient):
     """
     try:
         db.session.add(ingredient)
-        db.session.commit()
+        commit()
+        on_commit(invalidate_ingredient_cache)
         return True
     except OperationalError as e:
         logger.info("insert_ingredient errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 def update_ingredient(ingredient_id, data):
     """
-    更新食材信息
+    更新食材信息（单条带条件的UPDATE，不预先查询）
     :param ingredient_id: 食材ID
     :param data: 更新数据字典
+    :return: 更新后的Ingredient实体，食材不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _INGREDIENT_UPDATE_FIELDS if key in data}
     try:
-        ingredient = query_ingredient_by_id(ingredient_id)
-        if ingredient is None:
-            return False
-        
-        if 'name' in data:
-            ingredient.name = data['name']
-        if 'category' in data:
-            ingredient.category = data['category']
-        if 'image_url' in data:
-            ingredient.image_url = data['image_url']
-        if 'risk_level' in data:
-            ingredient.risk_level = data['risk_level']
-        if 'nutrients' in data:
-            ingredient.nutrients = data['nutrients']
-        if 'summary' in data:
-            ingredient.summary = data['summary']
-        if 'description' in data:
-            ingredient.description = data['description']
-        if 'suitable_month_from' in data:
-            ingredient.suitable_month_from = data['suitable_month_from']
-        if 'suitable_month_to' in data:
-            ingredient.suitable_month_to = data['suitable_month_to']
-            
-        db.session.commit()
-        return True
+        if values:
+            # 批量UPDATE不会把onupdate生成的值同步到会话中的对象，显式带上更新时间
+            values['updated_at'] = datetime.now()
+            updated = Ingredient.query.filter(Ingredient.id == ingredient_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        ingredient = Ingredient.query.get(ingredient_id)
+        commit()
+        on_commit(invalidate_ingredient_cache)
+        return ingredient
     except OperationalError as e:
         logger.info("update_ingredient errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -105,15 +381,17 @@ def delete_ingredient(ingredient_id):
         if ingredient is None:
             return False
         db.session.delete(ingredient)
-        db.session.commit()
+        commit()
+        on_commit(invalidate_ingredient_cache)
         return True
     except OperationalError as e:
         logger.info("delete_ingredient errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 # ==================== 食材尝试记录表相关操作 ====================
+@replica_read
 def query_food_trial_by_id(trial_id):
     """
     根据ID查询食材尝试记录
@@ -127,6 +405,7 @@ def query_food_trial_by_id(trial_id):
         return None
 
 
+@replica_read
 def query_food_trials_by_baby(baby_id):
     """
     根据宝宝ID查询食材尝试记录列表
@@ -140,6 +419,113 @@ def query_food_trials_by_baby(baby_id):
         return []
 
 
+@replica_read
+def query_trial_summary(baby_id):
+    """
+    按食材汇总宝宝的尝试记录（单次GROUP BY查询）
+    :param baby_id: 宝宝ID
+    :return: 汇总列表（按最近尝试日期倒序），每项包含 ingredient_id、trial_count（累计尝试次数）、
+             record_count（记录条数）、first_trial_date、last_trial_date、worst_reaction_level、is_allergic
+    """
+    severity = case({level: rank for rank, level in enumerate(_REACTION_LEVELS)},
+                    value=FoodTrial.reaction_level, else_=0)
+    last_trial_date = func.max(FoodTrial.trial_date)
+    try:
+        rows = db.session.query(
+            FoodTrial.ingredient_id,
+            func.coalesce(func.sum(FoodTrial.trial_count), 0),
+            func.count(FoodTrial.id),
+            func.min(FoodTrial.trial_date),
+            last_trial_date,
+            func.max(severity),
+            func.max(case((FoodTrial.is_allergic.is_(True), 1), else_=0))
+        ).filter(FoodTrial.baby_id == baby_id) \
+            .group_by(FoodTrial.ingredient_id) \
+            .order_by(last_trial_date.desc(), FoodTrial.ingredient_id).all()
+    except OperationalError as e:
+        logger.info("query_trial_summary errorMsg= {} ".format(e))
+        return []
+    return [{
+        'ingredient_id': ingredient_id,
+        'trial_count': int(trial_count),
+        'record_count': record_count,
+        'first_trial_date': first_trial_date,
+        'last_trial_date': last_date,
+        'worst_reaction_level': _REACTION_LEVELS[worst or 0],
+        'is_allergic': bool(allergic),
+    } for ingredient_id, trial_count, record_count, first_trial_date, last_date, worst, allergic in rows]
+
+
+def age_in_months(birth_date, on_date):
+    """
+    计算周岁月龄（未满一个月的部分不计）
+    """
+    months = (on_date.year - birth_date.year) * 12 + on_date.month - birth_date.month
+    if on_date.day < birth_date.day:
+        months -= 1
+    return max(months, 0)
+
+
+@replica_read
+def query_allergic_ingredient_ids(baby_id):
+    """
+    查询宝宝有过敏记录的食材ID
+    :param baby_id: 宝宝ID
+    :return: 食材ID集合
+    """
+    try:
+        rows = db.session.query(FoodTrial.ingredient_id).filter(
+            FoodTrial.baby_id == baby_id,
+            FoodTrial.is_allergic.is_(True)
+        ).distinct().all()
+        return {ingredient_id for ingredient_id, in rows}
+    except OperationalError as e:
+        logger.info("query_allergic_ingredient_ids errorMsg= {} ".format(e))
+        return set()
+
+
+@replica_read
+def query_eligible_ingredients(baby, on_date, category=None, max_risk=None):
+    """
+    查询宝宝在某天可以吃的食材：适用于当时月龄，且不在避免食材列表中、没有过敏记录
+    :param baby: Baby实体
+    :param on_date: 日期（用于计算月龄）
+    :param category: 分类筛选
+    :param max_risk: 最高过敏风险等级（low/medium/high），None表示不限
+    :return: Ingredient列表（按 category, name, id 排序）和月龄
+    """
+    age_months = age_in_months(baby.birth_date, on_date)
+    # 避免食材列表中可以是食材ID或名称
+    avoid = {item for item in baby.avoid_ingredients or [] if isinstance(item, str)}
+    excluded_ids = query_allergic_ingredient_ids(baby.id)
+    risks = _RISK_LEVELS[:_RISK_LEVELS.index(max_risk) + 1] if max_risk else _RISK_LEVELS
+
+    snapshot = _catalog.get()
+    if snapshot is not None:
+        ingredients = [i for i in snapshot.suitable(age_months)
+                       if i.id not in excluded_ids and i.id not in avoid and i.name not in avoid
+                       and (i.risk_level or 'low') in risks and (not category or i.category == category)]
+        return ingredients, age_months
+    try:
+        query = Ingredient.query.filter(
+            or_(Ingredient.suitable_month_from.is_(None), Ingredient.suitable_month_from <= age_months),
+            or_(Ingredient.suitable_month_to.is_(None), Ingredient.suitable_month_to >= age_months)
+        )
+        if excluded_ids or avoid:
+            query = query.filter(Ingredient.id.notin_(excluded_ids | avoid))
+        if avoid:
+            query = query.filter(Ingredient.name.notin_(avoid))
+        if max_risk:
+            query = query.filter(or_(Ingredient.risk_level.is_(None), Ingredient.risk_level.in_(risks)))
+        if category:
+            query = query.filter(Ingredient.category == category)
+        ingredients = query.order_by(*_catalog_order_columns()).all()
+        return ingredients, age_months
+    except OperationalError as e:
+        logger.info("query_eligible_ingredients errorMsg= {} ".format(e))
+        return [], age_months
+
+
 def insert_food_trial(trial):
     """
     插入食材尝试记录
@@ -147,41 +533,50 @@ def insert_food_trial(trial):
     """
     try:
         db.session.add(trial)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("insert_food_trial errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
+        return False
+
+
+def insert_food_trials(trials):
+    """
+    批量插入食材尝试记录（单次事务，同类实体的INSERT会合并为批量执行）
+    :param trials: FoodTrial实体列表
+    """
+    try:
+        db.session.add_all(trials)
+        commit()
+        return True
+    except (OperationalError, IntegrityError) as e:
+        logger.info("insert_food_trials errorMsg= {} ".format(e))
+        rollback()
         return False
 
 
 def update_food_trial(trial_id, data):
     """
-    更新食材尝试记录
+    更新食材尝试记录（单条带条件的UPDATE，不预先查询）
     :param trial_id: 记录ID
     :param data: 更新数据字典
+    :return: 更新后的FoodTrial实体，记录不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _FOOD_TRIAL_UPDATE_FIELDS if key in data}
     try:
-        trial = query_food_trial_by_id(trial_id)
-        if trial is None:
-            return False
-        
-        if 'trial_date' in data:
-            trial.trial_date = data['trial_date']
-        if 'trial_count' in data:
-            trial.trial_count = data['trial_count']
-        if 'is_allergic' in data:
-            trial.is_allergic = data['is_allergic']
-        if 'reaction_level' in data:
-            trial.reaction_level = data['reaction_level']
-        if 'notes' in data:
-            trial.notes = data['notes']
-            
-        db.session.commit()
-        return True
+        if values:
+            updated = FoodTrial.query.filter(FoodTrial.id == trial_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        trial = FoodTrial.query.get(trial_id)
+        commit()
+        return trial
     except OperationalError as e:
         logger.info("update_food_trial errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -195,10 +590,10 @@ def delete_food_trial(trial_id):
         if trial is None:
             return False
         db.session.delete(trial)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_food_trial errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
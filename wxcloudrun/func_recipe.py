@@ -1,14 +1,24 @@
 import logging
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
 from wxcloudrun import db
-from wxcloudrun.tables import Recipe, RecipeItem
+from wxcloudrun.routing import replica_read
+from wxcloudrun.tables import Recipe, RecipeItem, meal_order
+from wxcloudrun.transaction import commit, rollback
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 食谱允许通过PATCH更新的字段
+_RECIPE_UPDATE_FIELDS = ('notes', 'auto_generated')
+
+# 食谱项允许通过PATCH更新的字段
+_RECIPE_ITEM_UPDATE_FIELDS = ('meal_type', 'ingredients', 'instructions')
+
 
 # ==================== 食谱主表相关操作 ====================
+@replica_read
 def query_recipe_by_id(recipe_id):
     """
     根据ID查询食谱实体
@@ -22,6 +32,7 @@ def query_recipe_by_id(recipe_id):
         return None
 
 
+@replica_read
 def query_recipe_by_baby_and_date(baby_id, recipe_date):
     """
     根据宝宝ID和日期查询食谱
@@ -38,6 +49,64 @@ def query_recipe_by_baby_and_date(baby_id, recipe_date):
         return None
 
 
+@replica_read
+def query_recipe_with_items_by_baby_and_date(baby_id, recipe_date):
+    """
+    根据宝宝ID和日期查询食谱及其餐次（单次联表查询）
+    :param baby_id: 宝宝ID
+    :param recipe_date: 食谱日期
+    :return: Recipe实体（items已加载）
+    """
+    try:
+        return Recipe.query.options(joinedload(Recipe.items)).filter(
+            and_(Recipe.baby_id == baby_id, Recipe.recipe_date == recipe_date)
+        ).first()
+    except OperationalError as e:
+        logger.info("query_recipe_with_items_by_baby_and_date errorMsg= {} ".format(e))
+        return None
+
+
+@replica_read
+def query_recipes_with_items_by_range(baby_id, date_from, date_to):
+    """
+    查询宝宝在日期范围内的食谱及其餐次（单次联表查询）
+    :param baby_id: 宝宝ID
+    :param date_from: 开始日期（包含）
+    :param date_to: 结束日期（包含）
+    :return: Recipe列表（按日期升序，items已加载）
+    """
+    try:
+        return Recipe.query.options(joinedload(Recipe.items)).filter(
+            Recipe.baby_id == baby_id,
+            Recipe.recipe_date >= date_from,
+            Recipe.recipe_date <= date_to
+        ).order_by(Recipe.recipe_date).all()
+    except OperationalError as e:
+        logger.info("query_recipes_with_items_by_range errorMsg= {} ".format(e))
+        return []
+
+
+def query_recipe_dates(baby_id, date_from, date_to):
+    """
+    查询宝宝在日期范围内已有食谱的日期（读主库，用于判断哪些日期还需要生成）
+    :param baby_id: 宝宝ID
+    :param date_from: 开始日期（包含）
+    :param date_to: 结束日期（包含）
+    :return: 日期集合
+    """
+    try:
+        rows = db.session.query(Recipe.recipe_date).filter(
+            Recipe.baby_id == baby_id,
+            Recipe.recipe_date >= date_from,
+            Recipe.recipe_date <= date_to
+        ).all()
+        return {recipe_date for recipe_date, in rows}
+    except OperationalError as e:
+        logger.info("query_recipe_dates errorMsg= {} ".format(e))
+        return None
+
+
+@replica_read
 def query_recipes_by_baby(baby_id):
     """
     根据宝宝ID查询所有食谱
@@ -58,57 +127,74 @@ def insert_recipe(recipe):
     """
     try:
         db.session.add(recipe)
-        db.session.commit()
+        commit()
         return True
-    except OperationalError as e:
+    except (OperationalError, IntegrityError) as e:
+        # 同一宝宝同一天已有食谱时违反 uniq_recipe_per_day 唯一约束
         logger.info("insert_recipe errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
+        return False
+
+
+def insert_recipes_with_items(recipes):
+    """
+    批量插入食谱及其餐次（单次事务，同类实体的INSERT会合并为批量执行）
+    :param recipes: Recipe实体列表（items已填充）
+    :return: 是否成功，某天已有食谱（唯一约束冲突）时整批不写入
+    """
+    try:
+        db.session.add_all(recipes)
+        commit()
+        return True
+    except (OperationalError, IntegrityError) as e:
+        logger.info("insert_recipes_with_items errorMsg= {} ".format(e))
+        rollback()
         return False
 
 
 def update_recipe(recipe_id, data):
     """
-    更新食谱信息
+    更新食谱信息（单条带条件的UPDATE，不预先查询）
     :param recipe_id: 食谱ID
     :param data: 更新数据字典
+    :return: 更新后的Recipe实体，食谱不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _RECIPE_UPDATE_FIELDS if key in data}
     try:
-        recipe = query_recipe_by_id(recipe_id)
-        if recipe is None:
-            return False
-        
-        if 'notes' in data:
-            recipe.notes = data['notes']
-        if 'auto_generated' in data:
-            recipe.auto_generated = data['auto_generated']
-            
-        db.session.commit()
-        return True
+        if values:
+            updated = Recipe.query.filter(Recipe.id == recipe_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        recipe = Recipe.query.get(recipe_id)
+        commit()
+        return recipe
     except OperationalError as e:
         logger.info("update_recipe errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 def delete_recipe(recipe_id):
     """
-    删除食谱
+    删除食谱及其餐次（单条DELETE，餐次由外键 fk_recipe_items_recipe 的 ON DELETE CASCADE 一并删除，不逐条加载）
     :param recipe_id: 食谱ID
     """
     try:
-        recipe = Recipe.query.get(recipe_id)
-        if recipe is None:
+        deleted = Recipe.query.filter(Recipe.id == recipe_id).delete(synchronize_session=False)
+        if deleted == 0:
             return False
-        db.session.delete(recipe)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_recipe errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
 # ==================== 食谱项表相关操作 ====================
+@replica_read
 def query_recipe_item_by_id(item_id):
     """
     根据ID查询食谱项
@@ -122,6 +208,7 @@ def query_recipe_item_by_id(item_id):
         return None
 
 
+@replica_read
 def query_recipe_items(recipe_id):
     """
     根据食谱ID查询所有食谱项
@@ -129,7 +216,8 @@ def query_recipe_items(recipe_id):
     :return: RecipeItem列表
     """
     try:
-        return RecipeItem.query.filter(RecipeItem.recipe_id == recipe_id).all()
+        return RecipeItem.query.filter(RecipeItem.recipe_id == recipe_id) \
+            .order_by(meal_order(RecipeItem.meal_type), RecipeItem.created_at).all()
     except OperationalError as e:
         logger.info("query_recipe_items errorMsg= {} ".format(e))
         return []
@@ -142,37 +230,50 @@ def insert_recipe_item(item):
     """
     try:
         db.session.add(item)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("insert_recipe_item errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
+        return False
+
+
+def insert_recipe_items(items):
+    """
+    批量插入食谱项（单次事务，同类实体的INSERT会合并为批量执行）
+    :param items: RecipeItem实体列表
+    """
+    try:
+        db.session.add_all(items)
+        commit()
+        return True
+    except (OperationalError, IntegrityError) as e:
+        logger.info("insert_recipe_items errorMsg= {} ".format(e))
+        rollback()
         return False
 
 
 def update_recipe_item(item_id, data):
     """
-    更新食谱项
+    更新食谱项（单条带条件的UPDATE，不预先查询）
     :param item_id: 食谱项ID
     :param data: 更新数据字典
+    :return: 更新后的RecipeItem实体，食谱项不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _RECIPE_ITEM_UPDATE_FIELDS if key in data}
     try:
-        item = query_recipe_item_by_id(item_id)
-        if item is None:
-            return False
-        
-        if 'meal_type' in data:
-            item.meal_type = data['meal_type']
-        if 'ingredients' in data:
-            item.ingredients = data['ingredients']
-        if 'instructions' in data:
-            item.instructions = data['instructions']
-            
-        db.session.commit()
-        return True
+        if values:
+            updated = RecipeItem.query.filter(RecipeItem.id == item_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        item = RecipeItem.query.get(item_id)
+        commit()
+        return item
     except OperationalError as e:
         logger.info("update_recipe_item errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -186,10 +287,10 @@ def delete_recipe_item(item_id):
         if item is None:
             return False
         db.session.delete(item)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_recipe_item errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
@@ -3,13 +3,19 @@ import logging
 from sqlalchemy.exc import OperationalError
 
 from wxcloudrun import db
+from wxcloudrun.routing import replica_read
 from wxcloudrun.tables import User
+from wxcloudrun.transaction import commit, rollback
 
 # 初始化日志
 logger = logging.getLogger('log')
 
+# 用户允许通过PATCH更新的字段
+_USER_UPDATE_FIELDS = ('nickname', 'avatar_url')
+
 
 # ==================== 用户表相关操作 ====================
+@replica_read
 def query_user_by_id(user_id):
     """
     根据ID查询用户实体
@@ -23,6 +29,7 @@ def query_user_by_id(user_id):
         return None
 
 
+# 登录时据此判断是否需要创建用户，必须读主库，避免只读库延迟导致重复创建
 def query_user_by_openid(openid):
     """
     根据微信openid查询用户实体
@@ -43,30 +50,32 @@ def insert_user(user):
     """
     try:
         db.session.add(user)
-        db.session.commit()
+        commit()
     except OperationalError as e:
         logger.info("insert_user errorMsg= {} ".format(e))
 
 
 def update_user_by_id(user_id, data):
     """
-    根据ID更新用户信息
+    根据ID更新用户信息（单条带条件的UPDATE，不预先查询）
     :param user_id: 用户ID
     :param data: 更新数据字典
+    :return: 更新后的User实体，用户不存在时返回None，失败时返回False
     """
+    values = {key: data[key] for key in _USER_UPDATE_FIELDS if key in data}
     try:
-        existing_user = query_user_by_id(user_id)
-        if existing_user is None:
-            return False
-        if 'nickname' in data:
-            existing_user.nickname = data['nickname']
-        if 'avatar_url' in data:
-            existing_user.avatar_url = data['avatar_url']
-        db.session.commit()
-        return True
+        if values:
+            updated = User.query.filter(User.id == user_id) \
+                .update(values, synchronize_session='evaluate')
+            if updated == 0:
+                return None
+        # 会话中已有该对象时直接复用，否则按主键读取一次用于响应
+        user = User.query.get(user_id)
+        commit()
+        return user
     except OperationalError as e:
         logger.info("update_user_by_id errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
 
 
@@ -80,9 +89,9 @@ def delete_user_by_id(user_id):
         if user is None:
             return False
         db.session.delete(user)
-        db.session.commit()
+        commit()
         return True
     except OperationalError as e:
         logger.info("delete_user_by_id errorMsg= {} ".format(e))
-        db.session.rollback()
+        rollback()
         return False
@@ -0,0 +1,166 @@
+import json
+import logging
+import sys
+import time
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import config
+from wxcloudrun import metrics
+
+# 初始化日志
+logger = logging.getLogger('log')
+
+# ==================== 请求耗时与SQL统计 ====================
+_request_duration = metrics.histogram('http_request_duration_seconds', '各接口请求处理耗时（秒）',
+                                      labelnames=('method', 'route'))
+_request_sql_queries = metrics.histogram('http_request_sql_queries', '各接口每次请求执行的SQL语句数',
+                                         labelnames=('method', 'route'),
+                                         buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+_request_sql_duration = metrics.histogram('http_request_sql_duration_seconds', '各接口每次请求的SQL累计耗时（秒）',
+                                          labelnames=('method', 'route'))
+
+
+def _in_request():
+    return has_app_context() and 'request_start' in g
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if _in_request():
+        g.sql_count += 1
+        g.sql_time += elapsed
+    if config.SLOW_QUERY_MS > 0 and elapsed * 1000 >= config.SLOW_QUERY_MS and not conn.info.get('explaining'):
+        _log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+    if context.connection is not None and context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+# ==================== 慢查询日志 ====================
+_slow_queries = metrics.counter('db_slow_queries_total', '超过慢查询阈值的SQL语句数')
+
+
+def _param_shape(parameters, executemany):
+    """
+    参数结构（只记录类型，不记录值，避免日志中出现用户数据）
+    """
+    def shape(params):
+        if isinstance(params, dict):
+            return {key: type(value).__name__ for key, value in params.items()}
+        if isinstance(params, (list, tuple)):
+            return [type(value).__name__ for value in params]
+        return type(params).__name__
+
+    if executemany:
+        return {'rows': len(parameters), 'row': shape(parameters[0]) if parameters else None}
+    return shape(parameters)
+
+
+def _caller():
+    """
+    查找发起查询的 func_* 函数（没有时取 views 中的接口函数）
+    """
+    frame = sys._getframe(2)
+    view = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('wxcloudrun.func_'):
+            return '{}.{}:{}'.format(module.rsplit('.', 1)[-1], frame.f_code.co_name, frame.f_lineno)
+        if view is None and module == 'wxcloudrun.views':
+            view = 'views.{}:{}'.format(frame.f_code.co_name, frame.f_lineno)
+        frame = frame.f_back
+    return view
+
+
+def _explain(conn, statement, parameters):
+    """
+    在同一连接上对慢查询执行 EXPLAIN（仅SELECT）
+    :return: 执行计划行列表，不支持或失败时返回None
+    """
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = {'mysql': 'EXPLAIN ', 'sqlite': 'EXPLAIN QUERY PLAN '}.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    conn.info['explaining'] = True
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.info("explain errorMsg= {} ".format(e))
+        return None
+    finally:
+        cursor.close()
+        conn.info['explaining'] = False
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed):
+    _slow_queries.inc()
+    record = {
+        'event': 'slow_query',
+        'duration_ms': round(elapsed * 1000, 2),
+        'statement': ' '.join(statement.split()),
+        'params': _param_shape(parameters, executemany),
+        'caller': _caller(),
+    }
+    if has_request_context():
+        record['route'] = request.url_rule.rule if request.url_rule is not None else request.path
+    if config.SLOW_QUERY_EXPLAIN and not executemany:
+        record['explain'] = _explain(conn, statement, parameters)
+    logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _before_request():
+    g.request_start = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+
+
+def _after_request(response):
+    if 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    # 按路由模板（如 /api/babies/<baby_id>）而不是实际路径统计，避免指标基数膨胀
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    _request_duration.labels(request.method, route).observe(elapsed)
+    _request_sql_queries.labels(request.method, route).observe(g.sql_count)
+    _request_sql_duration.labels(request.method, route).observe(g.sql_time)
+
+    response.headers['Server-Timing'] = 'app;dur={:.1f}, db;dur={:.1f};desc="{} queries"'.format(
+        elapsed * 1000, g.sql_time * 1000, g.sql_count)
+
+    if config.REQUEST_LOG:
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'sql_count': g.sql_count,
+            'sql_ms': round(g.sql_time * 1000, 2),
+        }, ensure_ascii=False))
+    return response
+
+
+def init_app(app):
+    """
+    注册请求耗时与SQL统计：响应头 Server-Timing、结构化日志及 /metrics 中的分接口直方图
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,72 @@
+import random
+import uuid
+from datetime import datetime
+
+from wxcloudrun.tables import Recipe, RecipeItem
+
+# 每天的餐次及每餐选用的食材数
+MEAL_SLOTS = (('breakfast', 2), ('morning_snack', 1), ('lunch', 2), ('afternoon_snack', 1), ('dinner', 2))
+
+
+# ==================== 食谱自动生成 ====================
+class _Rotation(object):
+    """
+    食材轮换：每次选用最久未用过的食材，同一餐尽量选择不同分类
+    从未用过的食材之间按随机（以宝宝和起始日期为种子，结果可复现）顺序选取
+    """
+
+    def __init__(self, seed):
+        self._rng = random.Random(seed)
+        self._rank = {}
+        self._last_used = {}
+        self._tick = 0
+
+    def _key(self, ingredient):
+        rank = self._rank.get(ingredient.id)
+        if rank is None:
+            rank = self._rank[ingredient.id] = self._rng.random()
+        return self._last_used.get(ingredient.id, -1), rank
+
+    def pick(self, ingredients, count):
+        """
+        :param ingredients: 可选食材列表
+        :param count: 选用的食材数
+        :return: 选中的食材列表
+        """
+        chosen, chosen_ids, categories = [], set(), set()
+        for _ in range(min(count, len(ingredients))):
+            candidates = [i for i in ingredients if i.id not in chosen_ids and i.category not in categories] \
+                or [i for i in ingredients if i.id not in chosen_ids]
+            ingredient = min(candidates, key=self._key)
+            chosen.append(ingredient)
+            chosen_ids.add(ingredient.id)
+            categories.add(ingredient.category)
+            self._tick += 1
+            self._last_used[ingredient.id] = self._tick
+        return chosen
+
+
+def plan_recipes(baby_id, day_ingredients, created_by=None):
+    """
+    按可选食材生成每天的食谱及各餐次（只构造实体，不写数据库）
+    :param baby_id: 宝宝ID
+    :param day_ingredients: [(日期, 当天可选的食材列表)]，按日期升序
+    :param created_by: 创建者用户ID
+    :return: Recipe列表（items已填充）
+    """
+    if not day_ingredients:
+        return []
+    rotation = _Rotation('{}:{}'.format(baby_id, day_ingredients[0][0].isoformat()))
+    now = datetime.now()
+    recipes = []
+    for day, ingredients in day_ingredients:
+        recipe = Recipe(id=str(uuid.uuid4()), baby_id=baby_id, recipe_date=day, created_by=created_by,
+                        auto_generated=True, notes='', created_at=now)
+        for meal_type, count in MEAL_SLOTS:
+            chosen = rotation.pick(ingredients, count)
+            recipe.items.append(RecipeItem(
+                id=str(uuid.uuid4()), meal_type=meal_type,
+                ingredients=[{'id': ingredient.id, 'name': ingredient.name} for ingredient in chosen],
+                instructions='', created_at=now))
+        recipes.append(recipe)
+    return recipes
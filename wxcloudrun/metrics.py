@@ -0,0 +1,101 @@
+import os
+import threading
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+from prometheus_client import Counter, Gauge, Histogram, Summary
+
+import config
+
+# ==================== 运行指标 ====================
+# 基于 prometheus_client。gunicorn 多worker部署时设置 PROMETHEUS_MULTIPROC_DIR（见 gunicorn.conf.py），
+# 各worker把指标写入该目录下的文件，GET /metrics 由处理请求的worker汇总所有worker后输出，
+# 计数器不会因请求落到不同worker而回退；单进程运行（python run.py）时直接输出进程内指标
+
+# 直方图默认的耗时分桶（秒）
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_registry = CollectorRegistry()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def _register(cls, name, help_text, **kwargs):
+    with _metrics_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help_text, registry=_registry, **kwargs)
+        return metric
+
+
+def counter(name, help_text):
+    """
+    获取（不存在时注册）计数器
+    :param name: 指标名
+    :param help_text: 指标说明
+    """
+    return _register(Counter, name, help_text)
+
+
+def gauge(name, help_text):
+    """
+    获取（不存在时注册）当前值指标，多worker时输出各存活worker的合计值
+    :param name: 指标名
+    :param help_text: 指标说明
+    """
+    return _register(Gauge, name, help_text, multiprocess_mode='livesum')
+
+
+def summary(name, help_text):
+    """
+    获取（不存在时注册）汇总指标（次数与总和）
+    :param name: 指标名
+    :param help_text: 指标说明
+    """
+    return _register(Summary, name, help_text)
+
+
+def histogram(name, help_text, labelnames=(), buckets=None):
+    """
+    获取（不存在时注册）直方图
+    :param name: 指标名
+    :param help_text: 指标说明
+    :param labelnames: 标签名列表
+    :param buckets: 桶上界列表，None表示使用默认的耗时分桶（秒）
+    """
+    return _register(Histogram, name, help_text, labelnames=labelnames,
+                     buckets=buckets if buckets is not None else _DURATION_BUCKETS)
+
+
+class _InstanceLabel(object):
+    """
+    为所有指标加上实例标签，通过负载均衡采集时可区分各实例
+    """
+
+    def __init__(self, registry, instance):
+        self._registry = registry
+        self._instance = instance
+
+    def collect(self):
+        for metric in self._registry.collect():
+            metric.samples = [sample._replace(labels=dict(sample.labels, instance=self._instance))
+                              for sample in metric.samples]
+            yield metric
+
+
+def render():
+    """
+    按 Prometheus 文本格式输出所有指标（多worker时为所有worker的汇总）
+    :return: 文本内容
+    """
+    registry = _registry
+    if _multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    if config.METRICS_INSTANCE:
+        registry = _InstanceLabel(registry, config.METRICS_INSTANCE)
+    return generate_latest(registry).decode('utf-8')
+
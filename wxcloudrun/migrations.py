@@ -0,0 +1,244 @@
+import logging
+from datetime import datetime
+
+import click
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.schema import CreateTable as CreateTableDDL
+
+from wxcloudrun import db
+from wxcloudrun.tables import BINARY_COLLATION, NotificationCounter
+
+# 初始化日志
+logger = logging.getLogger('log')
+
+# 已执行的迁移版本记录表（不属于业务模型，单独维护元数据）
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),  # 迁移版本号
+    Column('description', String(255)),  # 迁移说明
+    Column('applied_at', DateTime(3), nullable=False),  # 执行时间
+)
+
+
+# ==================== 迁移操作 ====================
+# 每个操作提供 applied(conn)：结构已满足时返回True，迁移时跳过（兼容按 SQL 脚本手工变更过的库）
+def _existing_indexes(conn, table):
+    """
+    表上已有的索引（含主键、唯一约束及 InnoDB 为外键自动建立的索引）
+    :return: [(索引名, 列元组, 是否唯一)]
+    """
+    inspector = inspect(conn)
+    indexes = [(index['name'], tuple(index['column_names']), bool(index['unique']))
+               for index in inspector.get_indexes(table)]
+    indexes.extend((constraint['name'], tuple(constraint['column_names']), True)
+                   for constraint in inspector.get_unique_constraints(table))
+    primary_key = inspector.get_pk_constraint(table)
+    if primary_key['constrained_columns']:
+        indexes.append(('PRIMARY', tuple(primary_key['constrained_columns']), True))
+    return indexes
+
+
+class AddIndex(object):
+    """
+    添加索引（MySQL下使用 ALGORITHM=INPLACE, LOCK=NONE 在线执行，不阻塞读写）
+    同名索引已存在，或已有索引的前导列与之相同（唯一索引要求列完全相同）时跳过，避免重复建索引
+    """
+
+    def __init__(self, table, name, columns, unique=False):
+        self.table = table
+        self.name = name
+        self.columns = tuple(columns)
+        self.unique = unique
+
+    def _covers(self, name, columns, unique):
+        if name == self.name:
+            return True
+        if self.unique:
+            return unique and columns == self.columns
+        return columns[:len(self.columns)] == self.columns
+
+    def applied(self, conn):
+        return any(self._covers(*index) for index in _existing_indexes(conn, self.table))
+
+    def statement(self, conn):
+        kind = 'UNIQUE INDEX' if self.unique else 'INDEX'
+        columns = ', '.join(self.columns)
+        if conn.dialect.name == 'mysql':
+            return 'ALTER TABLE {} ADD {} {} ({}), ALGORITHM=INPLACE, LOCK=NONE'.format(
+                self.table, kind, self.name, columns)
+        return 'CREATE {} {} ON {} ({})'.format(kind, self.name, self.table, columns)
+
+    def apply(self, conn):
+        conn.execute(text(self.statement(conn)))
+
+    def __str__(self):
+        return '{} {}({})'.format('unique index' if self.unique else 'index', self.name, ', '.join(self.columns))
+
+
+class DropIndex(object):
+    """
+    删除已被组合索引取代的索引（MySQL下在线执行），索引不存在时跳过
+    需排在取代它的 AddIndex 之后，外键列始终有索引可用
+    """
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    def applied(self, conn):
+        return all(name != self.name for name, _, _ in _existing_indexes(conn, self.table))
+
+    def statement(self, conn):
+        if conn.dialect.name == 'mysql':
+            return 'ALTER TABLE {} DROP INDEX {}, ALGORITHM=INPLACE, LOCK=NONE'.format(self.table, self.name)
+        return 'DROP INDEX {}'.format(self.name)
+
+    def apply(self, conn):
+        conn.execute(text(self.statement(conn)))
+
+    def __str__(self):
+        return 'drop index {}'.format(self.name)
+
+
+class SetColumnCollation(object):
+    """
+    修改列的排序规则（仅MySQL，其他数据库跳过）
+    MODIFY 需写出完整的列定义，column_type 与 options（NULL约束、注释）须与现有表结构一致；
+    会重建表，只用于数据量小的表
+    """
+
+    def __init__(self, table, column, column_type, collation, options=''):
+        self.table = table
+        self.column = column
+        self.column_type = column_type
+        self.collation = collation
+        self.options = options
+
+    def applied(self, conn):
+        if conn.dialect.name != 'mysql':
+            return True
+        for column in inspect(conn).get_columns(self.table):
+            if column['name'] == self.column:
+                return getattr(column['type'], 'collation', None) == self.collation
+        return False
+
+    def statement(self, conn):
+        return 'ALTER TABLE {} MODIFY {} {} CHARACTER SET utf8mb4 COLLATE {} {}'.format(
+            self.table, self.column, self.column_type, self.collation, self.options).strip()
+
+    def apply(self, conn):
+        conn.execute(text(self.statement(conn)))
+
+    def __str__(self):
+        return 'collation {}.{} {}'.format(self.table, self.column, self.collation)
+
+
+class CreateTable(object):
+    """
+    按模型定义创建新表，表已存在时跳过
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def applied(self, conn):
+        return inspect(conn).has_table(self.table.name)
+
+    def statement(self, conn):
+        return str(CreateTableDDL(self.table).compile(dialect=conn.dialect)).strip()
+
+    def apply(self, conn):
+        self.table.create(conn)
+
+    def __str__(self):
+        return 'table {}'.format(self.table.name)
+
+
+# 迁移列表：(版本号, 说明, 操作列表)，版本号只增不改
+MIGRATIONS = [
+    (1, '为按宝宝/用户查询的热点表添加组合索引', [
+        AddIndex('food_trials', 'idx_trials_baby_date', ('baby_id', 'trial_date')),
+        AddIndex('recipes', 'uniq_recipe_per_day', ('baby_id', 'recipe_date'), unique=True),
+        AddIndex('recipe_items', 'uniq_recipe_meal', ('recipe_id', 'meal_type'), unique=True),
+        AddIndex('events', 'idx_events_baby_start', ('baby_id', 'start_date')),
+        AddIndex('notifications', 'idx_notifications_user_read_created', ('user_id', 'is_read', 'created_at')),
+        # MySQL 上外键 fk_family_members_user 已自动建立 user_id 索引，此时跳过
+        AddIndex('family_members', 'idx_family_members_user', ('user_id',)),
+        # 单列索引已是上面组合索引的前缀，不再需要
+        DropIndex('food_trials', 'idx_trials_baby'),
+        DropIndex('events', 'idx_events_baby'),
+        DropIndex('notifications', 'idx_notifications_user'),
+    ]),
+    (2, '通知按用户、创建时间分页及增量同步的索引', [
+        AddIndex('notifications', 'idx_notifications_user_created', ('user_id', 'created_at')),
+    ]),
+    (3, '用户未读通知计数表', [
+        CreateTable(NotificationCounter.__table__),
+    ]),
+    (4, '食材目录游标分页索引（分类、名称改为按码点比较，与目录缓存排序一致）', [
+        SetColumnCollation('ingredients', 'category', 'VARCHAR(50)', BINARY_COLLATION,
+                           "NULL COMMENT '分类（如蔬菜、水果、谷物）'"),
+        SetColumnCollation('ingredients', 'name', 'VARCHAR(100)', BINARY_COLLATION,
+                           "NOT NULL COMMENT '食材名称'"),
+        AddIndex('ingredients', 'idx_ingredients_catalog', ('category', 'name', 'id')),
+    ]),
+]
+
+
+def query_applied_versions(conn):
+    """
+    查询已执行的迁移版本
+    :param conn: 数据库连接
+    :return: 版本号集合，版本记录表不存在时为空集合
+    """
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return {row.version for row in conn.execute(schema_migrations.select())}
+
+
+def run_migrations(dry_run=False):
+    """
+    按版本号顺序执行尚未执行的迁移
+    :param dry_run: 只输出将要执行的语句，不实际执行
+    :return: 本次执行的版本号列表
+    """
+    applied = []
+    with db.engine.connect() as conn:
+        done = query_applied_versions(conn)
+        if not dry_run:
+            schema_migrations.create(conn, checkfirst=True)
+        for version, description, operations in MIGRATIONS:
+            if version in done:
+                continue
+            logger.info("migration {} start: {}".format(version, description))
+            for operation in operations:
+                if operation.applied(conn):
+                    logger.info("migration {} skip applied {}".format(version, operation))
+                    continue
+                if dry_run:
+                    click.echo(operation.statement(conn))
+                    continue
+                operation.apply(conn)
+                logger.info("migration {} applied {}".format(version, operation))
+            if not dry_run:
+                conn.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=datetime.now()))
+            applied.append(version)
+    return applied
+
+
+def init_app(app):
+    """
+    注册数据库迁移命令: flask migrate
+    """
+    @app.cli.command('migrate')
+    @click.option('--dry-run', is_flag=True, help='只输出将要执行的语句')
+    def migrate_command(dry_run):
+        """执行数据库结构迁移"""
+        versions = run_migrations(dry_run)
+        if versions:
+            click.echo('{} migrations: {}'.format('pending' if dry_run else 'applied',
+                                                ', '.join(str(v) for v in versions)))
+        else:
+            click.echo('database schema is up to date')
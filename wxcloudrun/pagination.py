@@ -0,0 +1,32 @@
+import base64
+import json
+
+
+# ==================== 游标分页工具 ====================
+def encode_cursor(values):
+    """
+    将排序键编码为不透明的游标字符串
+    :param values: 排序键列表（最后一条记录的排序字段值）
+    :return: 游标字符串
+    """
+    raw = json.dumps(values, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """
+    解码游标字符串
+    :param cursor: 游标字符串
+    :param types: 排序键各字段允许的类型（类型或类型元组），字段个数即排序键长度
+    :return: 排序键列表，游标无效或字段类型不符时返回None
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    if not all(isinstance(value, allowed) for value, allowed in zip(values, types)):
+        return None
+    return values
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from wxcloudrun import metrics
+
+# 初始化日志
+logger = logging.getLogger('log')
+
+# ==================== 数据库连接池指标 ====================
+_checkouts = metrics.counter('db_pool_checkouts_total', '从连接池取出连接的次数')
+_checkout_wait = metrics.summary('db_pool_checkout_wait_seconds', '从连接池取连接的等待时间（含新建连接）')
+_checkout_timeouts = metrics.counter('db_pool_checkout_timeouts_total', '连接池耗尽、等待超时的次数')
+_connects = metrics.counter('db_pool_connects_total', '新建数据库连接的次数（含回收、失效后的重连）')
+_invalidations = metrics.counter('db_pool_invalidations_total', '连接失效（pre-ping失败或断线）需要重连的次数')
+
+# 进程内所有连接池（主库、只读库等），取出/归还连接时更新当前占用情况
+_pools = weakref.WeakSet()
+_checked_out = metrics.gauge('db_pool_checked_out', '当前已取出（使用中）的连接数')
+_idle = metrics.gauge('db_pool_idle', '当前连接池中空闲的连接数')
+_overflow = metrics.gauge('db_pool_overflow', '当前超出pool_size的连接数')
+
+
+def _update_usage():
+    pools = list(_pools)
+    _checked_out.set(sum(pool.checkedout() for pool in pools))
+    _idle.set(sum(pool.checkedin() for pool in pools))
+    _overflow.set(sum(max(pool.overflow(), 0) for pool in pools))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    记录取连接等待时间的 QueuePool
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self._timing = threading.local()
+        _pools.add(self)
+
+    def _do_get(self):
+        # QueuePool._do_get 在溢出竞争时会递归调用自身，只统计最外层
+        if getattr(self._timing, 'active', False):
+            return super(TimedQueuePool, self)._do_get()
+        self._timing.active = True
+        start = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            _checkout_timeouts.inc()
+            raise
+        finally:
+            self._timing.active = False
+            _checkout_wait.observe(time.perf_counter() - start)
+
+    def _do_return_conn(self, conn):
+        # checkin 事件在连接真正归还前触发，归还后再更新占用情况
+        super(TimedQueuePool, self)._do_return_conn(conn)
+        _update_usage()
+
+
+@event.listens_for(TimedQueuePool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _checkouts.inc()
+    _update_usage()
+
+
+@event.listens_for(TimedQueuePool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    _connects.inc()
+
+
+@event.listens_for(TimedQueuePool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _invalidations.inc()
+
+
+def prewarm(app, count):
+    """
+    在后台线程中预先建立数据库连接（主库及只读库），不阻塞应用启动
+    :param app: Flask应用
+    :param count: 每个连接池预先建立的连接数
+    """
+    def run():
+        from wxcloudrun import db
+        with app.app_context():
+            binds = [None] + list(app.config.get('SQLALCHEMY_BINDS') or {})
+            for bind in binds:
+                connections = []
+                try:
+                    engine = db.get_engine(app, bind=bind)
+                    for _ in range(count):
+                        connections.append(engine.connect())
+                except Exception as e:
+                    logger.info("prewarm {} errorMsg= {} ".format(bind or 'primary', e))
+                finally:
+                    # 归还到连接池，供后续请求直接复用
+                    for connection in connections:
+                        connection.close()
+
+    threading.Thread(target=run, name='db-prewarm', daemon=True).start()
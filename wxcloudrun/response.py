@@ -1,18 +1,97 @@
 import json
+from datetime import date, datetime
+from decimal import Decimal
 
 from flask import Response
 
+import config
 
+# orjson已列入requirements.txt；未安装（如平台没有可用的预编译包）时回退到标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# ==================== JSON序列化 ====================
+def _default(obj):
+    """
+    处理标准库json无法直接序列化的类型（日期、Decimal）
+    """
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _dumps_json(data):
+    return json.dumps(data, default=_default)
+
+
+def _dumps_orjson(data):
+    # orjson原生支持date/datetime，输出格式与isoformat()一致
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+_serializers = {'json': _dumps_json}
+if orjson is not None:
+    _serializers['orjson'] = _dumps_orjson
+
+
+def register_serializer(name, func):
+    """
+    注册JSON序列化函数
+    :param name: 序列化器名称
+    :param func: 接收数据、返回str或bytes的函数
+    """
+    _serializers[name] = func
+
+
+def get_serializer(name=None):
+    """
+    获取JSON序列化函数
+    :param name: 序列化器名称，None表示按配置选择（auto时优先使用orjson）
+    :return: 序列化函数
+    """
+    name = name or config.JSON_SERIALIZER
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in _serializers else 'json'
+    return _serializers.get(name, _dumps_json)
+
+
+_dumps = get_serializer()
+
+
+def use_serializer(name):
+    """
+    切换响应使用的序列化器
+    :param name: 序列化器名称（json、orjson、auto或已注册的名称）
+    """
+    global _dumps
+    _dumps = get_serializer(name)
+
+
+def dumps(data):
+    """
+    使用当前序列化器序列化数据
+    :param data: 响应数据（可包含date/datetime）
+    :return: str或bytes
+    """
+    return _dumps(data)
+
+
+# ==================== 响应构造 ====================
 def make_succ_empty_response():
-    data = json.dumps({'code': 0, 'data': {}})
+    data = dumps({'code': 0, 'data': {}})
     return Response(data, mimetype='application/json')
 
 
 def make_succ_response(data):
-    data = json.dumps({'code': 0, 'data': data})
+    data = dumps({'code': 0, 'data': data})
     return Response(data, mimetype='application/json')
 
 
 def make_err_response(err_msg):
-    data = json.dumps({'code': -1, 'errorMsg': err_msg})
+    data = dumps({'code': -1, 'errorMsg': err_msg})
     return Response(data, mimetype='application/json')
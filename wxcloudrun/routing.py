@@ -0,0 +1,65 @@
+import threading
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+
+# 只读库在 SQLALCHEMY_BINDS 中的名称
+REPLICA_BIND = 'replica'
+
+# 当前线程是否正在执行只读查询
+_local = threading.local()
+
+
+# ==================== 读写分离 ====================
+def replica_read(func):
+    """
+    标记只读查询函数：配置了只读库时，函数内的查询发往只读库
+    本次请求已经写过主库时仍读主库，保证读到自己的写入
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, 'replica', False):
+            return func(*args, **kwargs)
+        _local.replica = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.replica = False
+    return wrapper
+
+
+def _mark_written():
+    if has_app_context():
+        g.db_written = True
+
+
+def _has_written():
+    return has_app_context() and g.get('db_written', False)
+
+
+class RoutingSession(SignallingSession):
+    """
+    按读写路由的会话：写操作（flush、INSERT/UPDATE/DELETE）使用主库，
+    replica_read 标记的查询在本次请求尚未写入时使用只读库
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            _mark_written()
+        elif getattr(_local, 'replica', False) and not _has_written():
+            binds = self.app.config.get('SQLALCHEMY_BINDS') or {}
+            if REPLICA_BIND in binds:
+                state = get_state(self.app)
+                return state.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    使用 RoutingSession 的 Flask-SQLAlchemy
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
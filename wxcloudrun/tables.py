@@ -1,8 +1,71 @@
+import operator
 from datetime import datetime
 
 from wxcloudrun import db
 
 
+# 模型序列化描述
+class Schema(object):
+    """
+    声明模型对外输出的字段，并按字段子集预编译取值函数
+    日期字段保持date/datetime类型，由response中的序列化器统一处理
+    """
+
+    def __init__(self, fields, default=None):
+        """
+        :param fields: 全部可输出字段
+        :param default: 默认输出字段（列表接口可省略较重的字段），None表示全部字段
+        """
+        self.fields = tuple(fields)
+        self.default = tuple(default) if default is not None else self.fields
+        self._compiled = {}
+
+    def _compile(self, fields):
+        compiled = self._compiled.get(fields)
+        if compiled is None:
+            getter = operator.attrgetter(*fields)
+            if len(fields) == 1:
+                single = getter
+                getter = lambda obj: (single(obj),)  # noqa: E731
+            compiled = self._compiled[fields] = getter
+        return compiled
+
+    def select(self, names):
+        """
+        从请求的字段名中筛选出合法字段（保持声明顺序）
+        :param names: 字段名列表
+        :return: 字段元组，没有合法字段时返回None
+        """
+        names = set(name.strip() for name in names)
+        fields = tuple(field for field in self.fields if field in names)
+        return fields or None
+
+    def dump(self, obj, fields=None):
+        """
+        序列化单个实体
+        :param obj: 模型实体
+        :param fields: 输出字段元组，None表示默认字段
+        :return: 字典
+        """
+        fields = fields or self.default
+        return dict(zip(fields, self._compile(fields)(obj)))
+
+    def dump_many(self, objs, fields=None):
+        """
+        序列化实体列表
+        :param objs: 模型实体列表
+        :param fields: 输出字段元组，None表示默认字段
+        :return: 字典列表
+        """
+        fields = fields or self.default
+        getter = self._compile(fields)
+        return [dict(zip(fields, getter(obj))) for obj in objs]
+
+
+# MySQL中按码点比较的排序规则
+BINARY_COLLATION = 'utf8mb4_bin'
+
+
 # 用户表
 class User(db.Model):
     # 设置结构体表格名称
@@ -14,6 +77,8 @@ class User(db.Model):
     avatar_url = db.Column(db.String(255))  # 用户头像URL
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 创建时间
 
+    schema = Schema(('id', 'nickname', 'avatar_url', 'created_at'))
+
 
 # 家庭表
 class Family(db.Model):
@@ -24,16 +89,23 @@ class Family(db.Model):
     created_by = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 创建者用户ID
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 创建时间
 
+    schema = Schema(('id', 'name', 'created_by', 'created_at'))
+
 
 # 家庭成员表
 class FamilyMember(db.Model):
     __tablename__ = 'family_members'
+    __table_args__ = (
+        db.Index('idx_family_members_user', 'user_id'),  # 按用户查询所属家庭
+    )
     
     family_id = db.Column(db.String(36), db.ForeignKey('families.id'), primary_key=True)  # 家庭ID
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)  # 用户ID
     role = db.Column(db.Enum('admin', 'member'), default='member')  # 成员角色
     joined_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 加入时间
 
+    schema = Schema(('family_id', 'user_id', 'role', 'joined_at'))
+
 
 # 宝宝表
 class Baby(db.Model):
@@ -48,14 +120,22 @@ class Baby(db.Model):
     avoid_ingredients = db.Column(db.JSON)  # 避免食材列表
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 创建时间
 
+    schema = Schema(('id', 'family_id', 'nickname', 'gender', 'birth_date', 'avatar_url',
+                     'avoid_ingredients', 'created_at'))
+
 
 # 食材表
 class Ingredient(db.Model):
     __tablename__ = 'ingredients'
+    __table_args__ = (
+        db.Index('idx_ingredients_catalog', 'category', 'name', 'id'),  # 食材目录按 category, name, id 游标分页
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 食材ID
-    name = db.Column(db.String(100), nullable=False)  # 食材名称
-    category = db.Column(db.String(50))  # 分类
+    # MySQL中分类、名称按码点比较（二进制排序规则），与食材目录缓存的排序一致
+    name = db.Column(db.String(100).with_variant(db.String(100, collation=BINARY_COLLATION), 'mysql'),
+                     nullable=False)  # 食材名称
+    category = db.Column(db.String(50).with_variant(db.String(50, collation=BINARY_COLLATION), 'mysql'))  # 分类
     image_url = db.Column(db.String(255))  # 插画或图片URL
     risk_level = db.Column(db.Enum('low', 'medium', 'high'), default='low')  # 过敏风险等级
     nutrients = db.Column(db.JSON)  # 营养构成
@@ -65,10 +145,19 @@ class Ingredient(db.Model):
     suitable_month_to = db.Column(db.Integer)  # 适用截止月龄
     updated_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now, onupdate=datetime.now)  # 最后更新时间
 
+    # 列表默认不输出较重的 description 字段
+    schema = Schema(('id', 'name', 'category', 'image_url', 'risk_level', 'nutrients', 'summary', 'description',
+                     'suitable_month_from', 'suitable_month_to', 'updated_at'),
+                    default=('id', 'name', 'category', 'image_url', 'risk_level', 'nutrients', 'summary',
+                             'suitable_month_from', 'suitable_month_to'))
+
 
 # 食材尝试记录表
 class FoodTrial(db.Model):
     __tablename__ = 'food_trials'
+    __table_args__ = (
+        db.Index('idx_trials_baby_date', 'baby_id', 'trial_date'),  # 按宝宝查询尝试记录
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 尝试记录ID
     baby_id = db.Column(db.String(36), db.ForeignKey('babies.id'), nullable=False)  # 宝宝ID
@@ -80,10 +169,27 @@ class FoodTrial(db.Model):
     notes = db.Column(db.Text)  # 备注
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 记录创建时间
 
+    schema = Schema(('id', 'baby_id', 'ingredient_id', 'trial_date', 'trial_count', 'is_allergic',
+                     'reaction_level', 'notes', 'created_at'))
+
+
+# 餐别（按一天中的先后顺序）
+MEAL_TYPES = ('breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner')
+
+
+def meal_order(meal_type):
+    """
+    餐别排序表达式（不依赖数据库对ENUM的排序方式）
+    """
+    return db.case({meal: index for index, meal in enumerate(MEAL_TYPES)}, value=meal_type, else_=len(MEAL_TYPES))
+
 
 # 食谱主表
 class Recipe(db.Model):
     __tablename__ = 'recipes'
+    __table_args__ = (
+        db.UniqueConstraint('baby_id', 'recipe_date', name='uniq_recipe_per_day'),  # 每个宝宝每天一份食谱
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 食谱ID
     baby_id = db.Column(db.String(36), db.ForeignKey('babies.id'), nullable=False)  # 宝宝ID
@@ -93,22 +199,36 @@ class Recipe(db.Model):
     notes = db.Column(db.Text)  # 备注说明
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 创建时间
 
+    # 食谱下的餐次（RecipeItem.recipe 反向引用），按一天中的餐次先后排序
+    items = db.relationship('RecipeItem', backref='recipe', cascade='all, delete-orphan',
+                            order_by=lambda: (meal_order(RecipeItem.meal_type), RecipeItem.created_at))
+
+    schema = Schema(('id', 'baby_id', 'recipe_date', 'created_by', 'auto_generated', 'notes', 'created_at'))
+
 
 # 食谱项表
 class RecipeItem(db.Model):
     __tablename__ = 'recipe_items'
+    __table_args__ = (
+        db.UniqueConstraint('recipe_id', 'meal_type', name='uniq_recipe_meal'),  # 每份食谱每个餐别一项，也用于按食谱查询餐次
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 食谱项ID
-    recipe_id = db.Column(db.String(36), db.ForeignKey('recipes.id'), nullable=False)  # 所属食谱ID
-    meal_type = db.Column(db.Enum('breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner'), nullable=False)  # 餐别
+    recipe_id = db.Column(db.String(36), db.ForeignKey('recipes.id', ondelete='CASCADE'), nullable=False)  # 所属食谱ID
+    meal_type = db.Column(db.Enum(*MEAL_TYPES), nullable=False)  # 餐别
     ingredients = db.Column(db.JSON)  # 所用食材列表
     instructions = db.Column(db.Text)  # 制作说明
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 创建时间
 
+    schema = Schema(('id', 'recipe_id', 'meal_type', 'ingredients', 'instructions', 'created_at'))
+
 
 # 特殊事件表
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('idx_events_baby_start', 'baby_id', 'start_date'),  # 按宝宝查询事件（按开始日期排序）
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 事件ID
     baby_id = db.Column(db.String(36), db.ForeignKey('babies.id'), nullable=False)  # 宝宝ID
@@ -118,10 +238,16 @@ class Event(db.Model):
     description = db.Column(db.Text)  # 描述说明
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 记录创建时间
 
+    schema = Schema(('id', 'baby_id', 'event_type', 'start_date', 'end_date', 'description', 'created_at'))
+
 
 # 通知表
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('idx_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),  # 按用户及已读状态查询通知
+        db.Index('idx_notifications_user_created', 'user_id', 'created_at'),  # 按用户分页/增量同步通知
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # 通知ID
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 接收用户ID
@@ -130,3 +256,14 @@ class Notification(db.Model):
     message = db.Column(db.Text)  # 内容
     is_read = db.Column(db.Boolean, default=False)  # 是否已读
     created_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now)  # 通知创建时间
+
+    schema = Schema(('id', 'user_id', 'type', 'title', 'message', 'is_read', 'created_at'))
+
+
+# 用户未读通知计数表
+class NotificationCounter(db.Model):
+    __tablename__ = 'notification_counters'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)  # 用户ID
+    unread_count = db.Column(db.Integer, nullable=False, default=0)  # 未读通知数
+    updated_at = db.Column(db.DateTime(3), nullable=False, default=datetime.now, onupdate=datetime.now)  # 最后更新时间
@@ -0,0 +1,106 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from wxcloudrun import db
+
+# 初始化日志
+logger = logging.getLogger('log')
+
+# 当前线程（请求）的工作单元状态
+_local = threading.local()
+
+
+class UnitOfWork(object):
+    """
+    工作单元：期间 func_* 层的写操作只 flush 不提交，
+    退出时统一提交一次；任意一步失败则整体回滚
+    """
+
+    def __init__(self):
+        self.failed = False
+        self._callbacks = []
+
+    @property
+    def succeeded(self):
+        return not self.failed
+
+
+def current_unit_of_work():
+    """
+    获取当前线程正在进行的工作单元
+    :return: UnitOfWork，不在工作单元中时返回None
+    """
+    return getattr(_local, 'unit', None)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    开启工作单元，嵌套调用时加入外层工作单元
+    用法:
+        with unit_of_work() as uow:
+            insert_family(family)
+            insert_family_member(member)
+        if not uow.succeeded:
+            ...
+    """
+    outer = current_unit_of_work()
+    if outer is not None:
+        yield outer
+        return
+
+    unit = UnitOfWork()
+    _local.unit = unit
+    try:
+        yield unit
+    except Exception:
+        unit.failed = True
+        raise
+    finally:
+        _local.unit = None
+        if not unit.failed:
+            try:
+                db.session.commit()
+            except (OperationalError, IntegrityError) as e:
+                logger.info("unit_of_work errorMsg= {} ".format(e))
+                unit.failed = True
+        if unit.failed:
+            db.session.rollback()
+        else:
+            for callback in unit._callbacks:
+                callback()
+
+
+def commit():
+    """
+    提交写操作：在工作单元中只 flush（提前暴露约束错误），由工作单元统一提交
+    """
+    if current_unit_of_work() is not None:
+        db.session.flush()
+    else:
+        db.session.commit()
+
+
+def rollback():
+    """
+    回滚写操作：在工作单元中标记整体失败，之前 flush 的写入一并回滚
+    """
+    unit = current_unit_of_work()
+    if unit is not None:
+        unit.failed = True
+    db.session.rollback()
+
+
+def on_commit(callback):
+    """
+    注册提交成功后执行的回调（如清除缓存）；不在工作单元中时立即执行
+    :param callback: 无参函数
+    """
+    unit = current_unit_of_work()
+    if unit is None:
+        callback()
+    else:
+        unit._callbacks.append(callback)
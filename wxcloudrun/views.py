@@ -1,8 +1,8 @@
-from datetime import datetime, date
-from flask import request
-from run import app
+from datetime import datetime, date, timedelta
+from flask import Blueprint, Response, abort, request
+import hmac
 import uuid
-import requests
+
 import config
 
 # 导入所有表模型
@@ -13,35 +13,242 @@ from wxcloudrun.func_user import query_user_by_id, query_user_by_openid, insert_
 
 # 导入家庭相关函数
 from wxcloudrun.func_family import (query_family_by_id, insert_family, update_family, delete_family,
-                                     query_family_members, query_family_member, insert_family_member, 
+                                     query_family_members_with_users,
+                                     query_family_member, insert_family_member, 
                                      delete_family_member, query_user_families)
 
 # 导入宝宝相关函数
-from wxcloudrun.func_baby import query_baby_by_id, query_babies_by_family, insert_baby, update_baby, delete_baby
+from wxcloudrun.func_baby import (query_baby_by_id, query_existing_baby_ids, query_babies_by_family, insert_baby,
+                                   update_baby, delete_baby)
 
 # 导入食材相关函数
-from wxcloudrun.func_ingredient import (query_ingredient_by_id, query_ingredients, insert_ingredient, 
+from wxcloudrun.func_ingredient import (query_ingredient_by_id, query_ingredients, query_ingredients_after,
+                                         query_ingredients_by_ids, query_eligible_ingredients, age_in_months,
+                                         insert_ingredient, 
                                          update_ingredient, delete_ingredient,
-                                         query_food_trial_by_id, query_food_trials_by_baby, 
-                                         insert_food_trial, update_food_trial, delete_food_trial)
+                                         query_food_trial_by_id, query_food_trials_by_baby, query_trial_summary,
+                                         insert_food_trial, insert_food_trials, update_food_trial, delete_food_trial)
 
 # 导入食谱相关函数
-from wxcloudrun.func_recipe import (query_recipe_by_id, query_recipe_by_baby_and_date, query_recipes_by_baby,
-                                     insert_recipe, update_recipe, delete_recipe,
-                                     query_recipe_item_by_id, query_recipe_items, insert_recipe_item,
+from wxcloudrun.func_recipe import (query_recipe_by_id, query_recipes_by_baby,
+                                     query_recipe_with_items_by_baby_and_date, query_recipes_with_items_by_range,
+                                     query_recipe_dates, insert_recipe, insert_recipes_with_items,
+                                     update_recipe, delete_recipe,
+                                     query_recipe_items, insert_recipe_item, insert_recipe_items,
                                      update_recipe_item, delete_recipe_item)
 
 # 导入事件相关函数
-from wxcloudrun.func_event import (query_event_by_id, query_events_by_baby, insert_event, update_event, delete_event,
-                                    query_notification_by_id, query_notifications_by_user, insert_notification,
-                                    mark_notification_read, mark_all_notifications_read, delete_notification)
+from wxcloudrun.func_event import (query_events_by_baby, query_events_in_range,
+                                    insert_event, insert_events,
+                                    update_event, delete_event,
+                                    query_notifications_by_user, query_notifications_page,
+                                    mark_notification_read, mark_all_notifications_read, delete_notification,
+                                    query_unread_count, insert_family_notifications)
+
+# 导入食谱自动生成
+from wxcloudrun.meal_plan import plan_recipes
+
+# 导入微信接口调用
+from wxcloudrun.wechat import code2session, WechatError, WechatTimeoutError, WechatUnavailableError
 
 # 导入响应函数
 from wxcloudrun.response import make_succ_response, make_succ_empty_response, make_err_response
 
+# 导入分页工具
+from wxcloudrun.pagination import encode_cursor, decode_cursor
+
+# 导入事务工具
+from wxcloudrun.transaction import unit_of_work
+
+# 导入运行指标
+from wxcloudrun import metrics
+
+# 所有接口注册在该蓝图上，由 create_app 挂载到应用
+bp = Blueprint('api', __name__)
+
+# 部分接口固定输出的字段子集
+_INGREDIENT_BRIEF_FIELDS = ('id', 'name', 'category', 'updated_at')
+_RECIPE_ITEM_NESTED_FIELDS = ('id', 'meal_type', 'ingredients', 'instructions')
+_RECIPE_ITEM_UPDATE_FIELDS = ('id', 'recipe_id', 'meal_type', 'ingredients', 'instructions')
+_EVENT_UPDATE_FIELDS = ('id', 'baby_id', 'event_type', 'start_date', 'end_date', 'description')
+
+
+def _requested_fields(schema):
+    """
+    解析列表接口的 ?fields= 参数（逗号分隔），用于只返回需要的字段
+    :param schema: 模型的Schema
+    :return: 字段元组，未指定或无合法字段时返回None（使用默认字段）
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return schema.select(fields.split(','))
+
+
+# 批量写入接口单次最多提交的记录数
+_BATCH_MAX_SIZE = 100
+
+# 分页接口每页最多返回的记录数
+_PAGE_SIZE_MAX = 100
+
+# 单次自动生成食谱的最大天数
+_GENERATE_MAX_DAYS = 31
+
+
+def _build_batch(build):
+    """
+    逐条校验并构造批量写入的实体：合法的记录一起写入，不合法的记录在逐条结果中返回错误信息
+    :param build: 单条构造函数，接收请求参数，返回 (实体, 错误信息)
+    :return: (合法实体列表, 与请求顺序一致的 (实体, 错误信息) 列表, 请求整体的错误信息)
+    """
+    rows = request.get_json()
+    if not isinstance(rows, list) or not rows:
+        return None, None, '请求体应为非空数组'
+    if len(rows) > _BATCH_MAX_SIZE:
+        return None, None, f'单次最多提交{_BATCH_MAX_SIZE}条'
+    
+    entities, results = [], []
+    for params in rows:
+        if not isinstance(params, dict):
+            results.append((None, '格式错误'))
+            continue
+        entity, error = build(params)
+        results.append((entity, error))
+        if not error:
+            entities.append(entity)
+    return entities, results, None
+
+
+def _batch_results(results, schema):
+    """
+    批量写入的逐条结果（与请求顺序一致）
+    :param results: _build_batch 返回的 (实体, 错误信息) 列表
+    :param schema: 模型的Schema
+    :return: 结果列表，成功的条目包含创建的记录，失败的条目包含错误信息
+    """
+    return [{'index': index, 'success': True, 'data': schema.dump(entity)} if not error
+            else {'index': index, 'success': False, 'error': error}
+            for index, (entity, error) in enumerate(results)]
+
+
+def _check_batch(results, check):
+    """
+    对已通过格式校验的记录逐条做进一步校验（外键是否存在、是否重复等），不通过的记录改为失败
+    :param results: _build_batch 返回的 (实体, 错误信息) 列表，原地更新
+    :param check: 校验函数，接收实体，返回错误信息，通过时返回None
+    :return: 仍然合法的实体列表
+    """
+    entities = []
+    for index, (entity, error) in enumerate(results):
+        if error:
+            continue
+        error = check(entity)
+        if error:
+            results[index] = (None, error)
+        else:
+            entities.append(entity)
+    return entities
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _build_food_trial(baby_id, params):
+    """
+    根据请求参数构造食材尝试记录
+    :param baby_id: 宝宝ID
+    :param params: 请求参数
+    :return: (FoodTrial实体, 错误信息)
+    """
+    if 'ingredient_id' not in params or 'trial_date' not in params:
+        return None, '缺少必需参数'
+    if not isinstance(params['ingredient_id'], str):
+        return None, 'ingredient_id须为字符串'
+    if params.get('reaction_level', 'none') not in ('none', 'mild', 'moderate', 'severe'):
+        return None, 'reaction_level无效'
+    if not _is_int(params.get('trial_count', 1)) or params.get('trial_count', 1) < 1:
+        return None, 'trial_count须为正整数'
+    if not isinstance(params.get('is_allergic', False), bool):
+        return None, 'is_allergic须为布尔值'
+    if not isinstance(params.get('notes', ''), str):
+        return None, 'notes须为字符串'
+    
+    trial = FoodTrial()
+    trial.id = str(uuid.uuid4())
+    trial.baby_id = baby_id
+    trial.ingredient_id = params['ingredient_id']
+    try:
+        trial.trial_date = datetime.strptime(params['trial_date'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None, '日期格式错误'
+    trial.trial_count = params.get('trial_count', 1)
+    trial.is_allergic = params.get('is_allergic', False)
+    trial.reaction_level = params.get('reaction_level', 'none')
+    trial.notes = params.get('notes', '')
+    trial.created_at = datetime.now()
+    return trial, None
+
+
+def _build_recipe_item(recipe_id, params):
+    """
+    根据请求参数构造食谱项
+    :param recipe_id: 食谱ID
+    :param params: 请求参数
+    :return: (RecipeItem实体, 错误信息)
+    """
+    if 'meal_type' not in params:
+        return None, '缺少meal_type参数'
+    if params['meal_type'] not in ('breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner'):
+        return None, 'meal_type无效'
+    if not isinstance(params.get('ingredients', []), list):
+        return None, 'ingredients须为数组'
+    if not isinstance(params.get('instructions', ''), str):
+        return None, 'instructions须为字符串'
+    
+    item = RecipeItem()
+    item.id = str(uuid.uuid4())
+    item.recipe_id = recipe_id
+    item.meal_type = params['meal_type']
+    item.ingredients = params.get('ingredients', [])
+    item.instructions = params.get('instructions', '')
+    item.created_at = datetime.now()
+    return item, None
+
+
+def _build_event(params):
+    """
+    根据请求参数构造事件
+    :param params: 请求参数
+    :return: (Event实体, 错误信息)
+    """
+    required_fields = ['baby_id', 'event_type', 'start_date']
+    for field in required_fields:
+        if field not in params:
+            return None, f'缺少必需参数: {field}'
+    if not isinstance(params['baby_id'], str):
+        return None, 'baby_id须为字符串'
+    if params['event_type'] not in ('illness', 'vaccine', 'other'):
+        return None, 'event_type无效'
+    if not isinstance(params.get('description', ''), str):
+        return None, 'description须为字符串'
+    
+    event = Event()
+    event.id = str(uuid.uuid4())
+    event.baby_id = params['baby_id']
+    event.event_type = params['event_type']
+    try:
+        event.start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+        event.end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date() if params.get('end_date') else None
+    except (TypeError, ValueError):
+        return None, '日期格式错误'
+    event.description = params.get('description', '')
+    event.created_at = datetime.now()
+    return event, None
+
 
 # ==================== 微信小程序登录接口 ====================
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
 def wechat_login():
     """
     微信小程序登录接口
@@ -56,17 +263,8 @@ def wechat_login():
     code = params['code']
 
     try:
-        # 调用微信接口获取openid和session_key
-        wechat_url = 'https://api.weixin.qq.com/sns/jscode2session'
-        wechat_params = {
-            'appid': config.WECHAT_APPID,
-            'secret': config.WECHAT_SECRET,
-            'js_code': code,
-            'grant_type': 'authorization_code'
-        }
-
-        response = requests.get(wechat_url, params=wechat_params, timeout=10, verify=False)
-        wechat_data = response.json()
+        # 调用微信接口获取openid和session_key（共享连接池，带超时、重试与熔断）
+        wechat_data = code2session(code)
 
         # 检查微信接口返回结果
         if 'errcode' in wechat_data and wechat_data['errcode'] != 0:
@@ -85,13 +283,8 @@ def wechat_login():
 
         if existing_user:
             # 用户已存在，返回用户信息
-            user_data = {
-                'id': existing_user.id,
-                'nickname': existing_user.nickname,
-                'avatar_url': existing_user.avatar_url,
-                'created_at': existing_user.created_at.isoformat(),
-                'isNewUser': False
-            }
+            user_data = User.schema.dump(existing_user)
+            user_data['isNewUser'] = False
         else:
             # 用户不存在，创建新用户
             user = User()
@@ -102,13 +295,8 @@ def wechat_login():
 
             insert_user(user)
 
-            user_data = {
-                'id': user.id,
-                'nickname': user.nickname,
-                'avatar_url': user.avatar_url,
-                'created_at': user.created_at.isoformat(),
-                'isNewUser': True
-            }
+            user_data = User.schema.dump(user)
+            user_data['isNewUser'] = True
 
         # 返回登录成功结果
         return make_succ_response({
@@ -117,16 +305,18 @@ def wechat_login():
             'unionid': unionid
         })
 
-    except requests.exceptions.Timeout:
+    except WechatTimeoutError:
         return make_err_response('微信登录超时，请稍后重试')
-    except requests.exceptions.RequestException as e:
+    except WechatUnavailableError:
+        return make_err_response('微信服务暂时不可用，请稍后重试')
+    except WechatError as e:
         return make_err_response(f'微信登录请求失败: {str(e)}')
     except Exception as e:
         return make_err_response(f'登录失败: {str(e)}')
 
 
 # ==================== 用户相关接口 ====================
-@app.route('/api/users/<user_id>', methods=['GET'])
+@bp.route('/api/users/<user_id>', methods=['GET'])
 def get_user(user_id):
     """
     根据ID获取用户信息
@@ -137,15 +327,10 @@ def get_user(user_id):
     if user is None:
         return make_err_response('用户不存在')
 
-    return make_succ_response({
-        'id': user.id,
-        'nickname': user.nickname,
-        'avatar_url': user.avatar_url,
-        'created_at': user.created_at.isoformat()
-    })
+    return make_succ_response(User.schema.dump(user))
 
 
-@app.route('/api/users/<user_id>', methods=['PATCH'])
+@bp.route('/api/users/<user_id>', methods=['PATCH'])
 def update_user(user_id):
     """
     更新用户信息
@@ -154,27 +339,17 @@ def update_user(user_id):
     """
     params = request.get_json()
 
-    # 检查用户是否存在
-    existing_user = query_user_by_id(user_id)
-    if existing_user is None:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_user = update_user_by_id(user_id, params)
+    if updated_user is None:
         return make_err_response('用户不存在')
-
-    # 更新用户信息
-    success = update_user_by_id(user_id, params)
-    if not success:
+    if not updated_user:
         return make_err_response('更新用户失败')
 
-    # 返回更新后的用户信息
-    updated_user = query_user_by_id(user_id)
-    return make_succ_response({
-        'id': updated_user.id,
-        'nickname': updated_user.nickname,
-        'avatar_url': updated_user.avatar_url,
-        'created_at': updated_user.created_at.isoformat()
-    })
+    return make_succ_response(User.schema.dump(updated_user))
 
 
-@app.route('/api/users/<user_id>', methods=['DELETE'])
+@bp.route('/api/users/<user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """
     删除用户
@@ -189,7 +364,7 @@ def delete_user(user_id):
 
 
 # ==================== 家庭管理接口 ====================
-@app.route('/api/families', methods=['POST'])
+@bp.route('/api/families', methods=['POST'])
 def create_family():
     """
     创建家庭
@@ -207,25 +382,31 @@ def create_family():
     family.created_by = params['created_by']
     family.created_at = datetime.now()
     
-    insert_family(family)
+    # 家庭与创建者的管理员身份在同一事务中写入
+    with unit_of_work() as uow:
+        insert_family(family)
+        insert_family_member(_build_admin_member(family))
+    if not uow.succeeded:
+        return make_err_response('创建家庭失败')
     
-    # 将创建者添加为家庭管理员
+    return make_succ_response(Family.schema.dump(family))
+
+
+def _build_admin_member(family):
+    """
+    构造家庭创建者的管理员成员记录
+    :param family: Family实体
+    :return: FamilyMember实体
+    """
     member = FamilyMember()
     member.family_id = family.id
-    member.user_id = params['created_by']
+    member.user_id = family.created_by
     member.role = 'admin'
     member.joined_at = datetime.now()
-    insert_family_member(member)
-    
-    return make_succ_response({
-        'id': family.id,
-        'name': family.name,
-        'created_by': family.created_by,
-        'created_at': family.created_at.isoformat()
-    })
+    return member
 
 
-@app.route('/api/families/<family_id>', methods=['GET'])
+@bp.route('/api/families/<family_id>', methods=['GET'])
 def get_family(family_id):
     """
     获取家庭信息
@@ -236,15 +417,10 @@ def get_family(family_id):
     if family is None:
         return make_err_response('家庭不存在')
     
-    return make_succ_response({
-        'id': family.id,
-        'name': family.name,
-        'created_by': family.created_by,
-        'created_at': family.created_at.isoformat()
-    })
+    return make_succ_response(Family.schema.dump(family))
 
 
-@app.route('/api/families/<family_id>/members', methods=['POST'])
+@bp.route('/api/families/<family_id>/members', methods=['POST'])
 def add_family_member(family_id):
     """
     添加家庭成员
@@ -275,39 +451,30 @@ def add_family_member(family_id):
     
     insert_family_member(member)
     
-    return make_succ_response({
-        'family_id': member.family_id,
-        'user_id': member.user_id,
-        'role': member.role,
-        'joined_at': member.joined_at.isoformat()
-    })
+    return make_succ_response(FamilyMember.schema.dump(member))
 
 
-@app.route('/api/families/<family_id>/members', methods=['GET'])
+@bp.route('/api/families/<family_id>/members', methods=['GET'])
 def get_family_members(family_id):
     """
     获取家庭成员列表
     :param family_id: 家庭ID
     :return: 成员列表
     """
-    members = query_family_members(family_id)
+    members = query_family_members_with_users(family_id)
     
-    members_data = []
-    for member in members:
-        user = query_user_by_id(member.user_id)
-        if user:
-            members_data.append({
-                'user_id': member.user_id,
-                'nickname': user.nickname,
-                'avatar_url': user.avatar_url,
-                'role': member.role,
-                'joined_at': member.joined_at.isoformat()
-            })
+    members_data = [{
+        'user_id': member.user_id,
+        'nickname': user.nickname,
+        'avatar_url': user.avatar_url,
+        'role': member.role,
+        'joined_at': member.joined_at
+    } for member, user in members]
     
     return make_succ_response(members_data)
 
 
-@app.route('/api/users/<user_id>/families', methods=['GET'])
+@bp.route('/api/users/<user_id>/families', methods=['GET'])
 def get_user_families(user_id):
     """
     获取用户所属的家庭列表
@@ -316,18 +483,11 @@ def get_user_families(user_id):
     """
     families = query_user_families(user_id)
     
-    families_data = [{
-        'id': family.id,
-        'name': family.name,
-        'created_by': family.created_by,
-        'created_at': family.created_at.isoformat()
-    } for family in families]
-    
-    return make_succ_response(families_data)
+    return make_succ_response(Family.schema.dump_many(families))
 
 
 # ==================== 宝宝管理接口 ====================
-@app.route('/api/babies', methods=['POST'])
+@bp.route('/api/babies', methods=['POST'])
 def create_baby():
     """
     添加宝宝
@@ -349,6 +509,7 @@ def create_baby():
     
     # 确定家庭ID
     family_id = params.get('family_id')
+    family = None
     
     # 如果没有提供family_id，检查用户是否有家庭
     if not family_id:
@@ -357,23 +518,12 @@ def create_baby():
             # 用户已有家庭，使用第一个家庭
             family_id = user_families[0].id
         else:
-            # 用户没有家庭，自动创建一个
+            # 用户没有家庭，自动创建一个（与宝宝在同一事务中写入）
             family = Family()
             family.id = str(uuid.uuid4())
             family.name = f"{params['nickname']}的家庭"
             family.created_by = params['created_by']
             family.created_at = datetime.now()
-            
-            insert_family(family)
-            
-            # 将创建者添加为家庭管理员
-            member = FamilyMember()
-            member.family_id = family.id
-            member.user_id = params['created_by']
-            member.role = 'admin'
-            member.joined_at = datetime.now()
-            insert_family_member(member)
-            
             family_id = family.id
     else:
         # 验证家庭是否存在
@@ -392,21 +542,19 @@ def create_baby():
     baby.avoid_ingredients = params.get('avoid_ingredients', [])
     baby.created_at = datetime.now()
     
-    insert_baby(baby)
+    with unit_of_work() as uow:
+        if family is not None:
+            insert_family(family)
+            # 将创建者添加为家庭管理员
+            insert_family_member(_build_admin_member(family))
+        insert_baby(baby)
+    if not uow.succeeded:
+        return make_err_response('添加宝宝失败')
     
-    return make_succ_response({
-        'id': baby.id,
-        'family_id': baby.family_id,
-        'nickname': baby.nickname,
-        'gender': baby.gender,
-        'birth_date': baby.birth_date.isoformat(),
-        'avatar_url': baby.avatar_url,
-        'avoid_ingredients': baby.avoid_ingredients,
-        'created_at': baby.created_at.isoformat()
-    })
+    return make_succ_response(Baby.schema.dump(baby))
 
 
-@app.route('/api/babies/<baby_id>', methods=['GET'])
+@bp.route('/api/babies/<baby_id>', methods=['GET'])
 def get_baby(baby_id):
     """
     获取宝宝信息
@@ -417,19 +565,10 @@ def get_baby(baby_id):
     if baby is None:
         return make_err_response('宝宝不存在')
     
-    return make_succ_response({
-        'id': baby.id,
-        'family_id': baby.family_id,
-        'nickname': baby.nickname,
-        'gender': baby.gender,
-        'birth_date': baby.birth_date.isoformat(),
-        'avatar_url': baby.avatar_url,
-        'avoid_ingredients': baby.avoid_ingredients,
-        'created_at': baby.created_at.isoformat()
-    })
+    return make_succ_response(Baby.schema.dump(baby))
 
 
-@app.route('/api/families/<family_id>/babies', methods=['GET'])
+@bp.route('/api/families/<family_id>/babies', methods=['GET'])
 def get_family_babies(family_id):
     """
     获取家庭下所有宝宝
@@ -438,21 +577,10 @@ def get_family_babies(family_id):
     """
     babies = query_babies_by_family(family_id)
     
-    babies_data = [{
-        'id': baby.id,
-        'family_id': baby.family_id,
-        'nickname': baby.nickname,
-        'gender': baby.gender,
-        'birth_date': baby.birth_date.isoformat(),
-        'avatar_url': baby.avatar_url,
-        'avoid_ingredients': baby.avoid_ingredients,
-        'created_at': baby.created_at.isoformat()
-    } for baby in babies]
-    
-    return make_succ_response(babies_data)
+    return make_succ_response(Baby.schema.dump_many(babies, _requested_fields(Baby.schema)))
 
 
-@app.route('/api/babies/<baby_id>', methods=['PATCH'])
+@bp.route('/api/babies/<baby_id>', methods=['PATCH'])
 def update_baby_info(baby_id):
     """
     更新宝宝信息
@@ -461,35 +589,21 @@ def update_baby_info(baby_id):
     """
     params = request.get_json()
     
-    # 检查宝宝是否存在
-    existing_baby = query_baby_by_id(baby_id)
-    if existing_baby is None:
-        return make_err_response('宝宝不存在')
-    
     # 处理日期格式
     if 'birth_date' in params:
         params['birth_date'] = datetime.strptime(params['birth_date'], '%Y-%m-%d').date()
     
-    # 更新宝宝信息
-    success = update_baby(baby_id, params)
-    if not success:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_baby = update_baby(baby_id, params)
+    if updated_baby is None:
+        return make_err_response('宝宝不存在')
+    if not updated_baby:
         return make_err_response('更新宝宝信息失败')
     
-    # 返回更新后的宝宝信息
-    updated_baby = query_baby_by_id(baby_id)
-    return make_succ_response({
-        'id': updated_baby.id,
-        'family_id': updated_baby.family_id,
-        'nickname': updated_baby.nickname,
-        'gender': updated_baby.gender,
-        'birth_date': updated_baby.birth_date.isoformat(),
-        'avatar_url': updated_baby.avatar_url,
-        'avoid_ingredients': updated_baby.avoid_ingredients,
-        'created_at': updated_baby.created_at.isoformat()
-    })
+    return make_succ_response(Baby.schema.dump(updated_baby))
 
 
-@app.route('/api/babies/<baby_id>', methods=['DELETE'])
+@bp.route('/api/babies/<baby_id>', methods=['DELETE'])
 def delete_baby_info(baby_id):
     """
     删除宝宝
@@ -504,30 +618,45 @@ def delete_baby_info(baby_id):
 
 
 # ==================== 食材库接口 ====================
-@app.route('/api/ingredients', methods=['GET'])
+@bp.route('/api/ingredients', methods=['GET'])
 def get_ingredients():
     """
     获取食材列表（分页）
+    传入after参数时使用游标分页（after为空字符串表示第一页），否则使用页码分页
     :return: 食材列表
     """
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', 20, type=int)
     category = request.args.get('category', None)
     
-    ingredients, total = query_ingredients(page, page_size, category)
+    if page < 1 or not 1 <= page_size <= _PAGE_SIZE_MAX:
+        return make_err_response(f'参数错误: page须大于0，page_size须在1~{_PAGE_SIZE_MAX}之间')
+    
+    cursor_mode = 'after' in request.args
+    if cursor_mode:
+        after = None
+        if request.args['after']:
+            # 排序键为 [category, name, id]，分类可以为空
+            after = decode_cursor(request.args['after'], ((str, type(None)), str, str))
+            if after is None:
+                return make_err_response('游标格式错误')
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        ingredients, next_after, total = query_ingredients_after(after, page_size, category, with_total)
+    else:
+        ingredients, total = query_ingredients(page, page_size, category)
     
-    ingredients_data = [{
-        'id': ingredient.id,
-        'name': ingredient.name,
-        'category': ingredient.category,
-        'image_url': ingredient.image_url,
-        'risk_level': ingredient.risk_level,
-        'nutrients': ingredient.nutrients,
-        'summary': ingredient.summary,
-        'suitable_month_from': ingredient.suitable_month_from,
-        'suitable_month_to': ingredient.suitable_month_to
-    } for ingredient in ingredients]
+    ingredients_data = Ingredient.schema.dump_many(ingredients, _requested_fields(Ingredient.schema))
     
+    if cursor_mode:
+        result = {
+            'ingredients': ingredients_data,
+            'next_cursor': encode_cursor(next_after) if next_after is not None else None,
+            'page_size': page_size
+        }
+        if total is not None:
+            result['total'] = total
+        return make_succ_response(result)
+
     return make_succ_response({
         'ingredients': ingredients_data,
         'total': total,
@@ -536,7 +665,7 @@ def get_ingredients():
     })
 
 
-@app.route('/api/ingredients/<ingredient_id>', methods=['GET'])
+@bp.route('/api/ingredients/<ingredient_id>', methods=['GET'])
 def get_ingredient(ingredient_id):
     """
     查看单个食材
@@ -547,22 +676,10 @@ def get_ingredient(ingredient_id):
     if ingredient is None:
         return make_err_response('食材不存在')
     
-    return make_succ_response({
-        'id': ingredient.id,
-        'name': ingredient.name,
-        'category': ingredient.category,
-        'image_url': ingredient.image_url,
-        'risk_level': ingredient.risk_level,
-        'nutrients': ingredient.nutrients,
-        'summary': ingredient.summary,
-        'description': ingredient.description,
-        'suitable_month_from': ingredient.suitable_month_from,
-        'suitable_month_to': ingredient.suitable_month_to,
-        'updated_at': ingredient.updated_at.isoformat()
-    })
+    return make_succ_response(Ingredient.schema.dump(ingredient, Ingredient.schema.fields))
 
 
-@app.route('/api/ingredients', methods=['POST'])
+@bp.route('/api/ingredients', methods=['POST'])
 def create_ingredient():
     """
     添加新食材
@@ -589,15 +706,10 @@ def create_ingredient():
     
     insert_ingredient(ingredient)
     
-    return make_succ_response({
-        'id': ingredient.id,
-        'name': ingredient.name,
-        'category': ingredient.category,
-        'updated_at': ingredient.updated_at.isoformat()
-    })
+    return make_succ_response(Ingredient.schema.dump(ingredient, _INGREDIENT_BRIEF_FIELDS))
 
 
-@app.route('/api/ingredients/<ingredient_id>', methods=['PATCH'])
+@bp.route('/api/ingredients/<ingredient_id>', methods=['PATCH'])
 def update_ingredient_info(ingredient_id):
     """
     更新食材信息
@@ -606,28 +718,18 @@ def update_ingredient_info(ingredient_id):
     """
     params = request.get_json()
     
-    # 检查食材是否存在
-    existing_ingredient = query_ingredient_by_id(ingredient_id)
-    if existing_ingredient is None:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_ingredient = update_ingredient(ingredient_id, params)
+    if updated_ingredient is None:
         return make_err_response('食材不存在')
-    
-    # 更新食材信息
-    success = update_ingredient(ingredient_id, params)
-    if not success:
+    if not updated_ingredient:
         return make_err_response('更新食材失败')
     
-    # 返回更新后的食材信息
-    updated_ingredient = query_ingredient_by_id(ingredient_id)
-    return make_succ_response({
-        'id': updated_ingredient.id,
-        'name': updated_ingredient.name,
-        'category': updated_ingredient.category,
-        'updated_at': updated_ingredient.updated_at.isoformat()
-    })
+    return make_succ_response(Ingredient.schema.dump(updated_ingredient, _INGREDIENT_BRIEF_FIELDS))
 
 
 # ==================== 食材尝试记录接口 ====================
-@app.route('/api/babies/<baby_id>/food-trials', methods=['POST'])
+@bp.route('/api/babies/<baby_id>/food-trials', methods=['POST'])
 def create_food_trial(baby_id):
     """
     添加食材尝试记录
@@ -636,37 +738,40 @@ def create_food_trial(baby_id):
     """
     params = request.get_json()
     
-    if 'ingredient_id' not in params or 'trial_date' not in params:
-        return make_err_response('缺少必需参数')
-    
-    # 创建记录
-    trial = FoodTrial()
-    trial.id = str(uuid.uuid4())
-    trial.baby_id = baby_id
-    trial.ingredient_id = params['ingredient_id']
-    trial.trial_date = datetime.strptime(params['trial_date'], '%Y-%m-%d').date()
-    trial.trial_count = params.get('trial_count', 1)
-    trial.is_allergic = params.get('is_allergic', False)
-    trial.reaction_level = params.get('reaction_level', 'none')
-    trial.notes = params.get('notes', '')
-    trial.created_at = datetime.now()
+    trial, error = _build_food_trial(baby_id, params)
+    if error:
+        return make_err_response(error)
     
     insert_food_trial(trial)
     
-    return make_succ_response({
-        'id': trial.id,
-        'baby_id': trial.baby_id,
-        'ingredient_id': trial.ingredient_id,
-        'trial_date': trial.trial_date.isoformat(),
-        'trial_count': trial.trial_count,
-        'is_allergic': trial.is_allergic,
-        'reaction_level': trial.reaction_level,
-        'notes': trial.notes,
-        'created_at': trial.created_at.isoformat()
-    })
+    return make_succ_response(FoodTrial.schema.dump(trial))
+
 
+@bp.route('/api/babies/<baby_id>/food-trials/batch', methods=['POST'])
+def create_food_trials_batch(baby_id):
+    """
+    批量添加食材尝试记录（校验通过的记录在一个事务中写入）
+    :param baby_id: 宝宝ID
+    :return: 与请求顺序一致的逐条结果
+    """
+    trials, results, error = _build_batch(lambda params: _build_food_trial(baby_id, params))
+    if error:
+        return make_err_response(error)
+    
+    if query_baby_by_id(baby_id) is None:
+        return make_err_response('宝宝不存在')
+    
+    # 一次查询所有引用的食材，不存在的记录单独返回错误
+    ingredients = query_ingredients_by_ids({trial.ingredient_id for trial in trials})
+    trials = _check_batch(results, lambda trial: None if trial.ingredient_id in ingredients else '食材不存在')
+    
+    if trials and not insert_food_trials(trials):
+        return make_err_response('批量添加尝试记录失败')
+    
+    return make_succ_response(_batch_results(results, FoodTrial.schema))
 
-@app.route('/api/babies/<baby_id>/food-trials', methods=['GET'])
+
+@bp.route('/api/babies/<baby_id>/food-trials', methods=['GET'])
 def get_food_trials(baby_id):
     """
     获取宝宝的食材尝试记录
@@ -675,23 +780,58 @@ def get_food_trials(baby_id):
     """
     trials = query_food_trials_by_baby(baby_id)
     
-    trials_data = [{
-        'id': trial.id,
-        'baby_id': trial.baby_id,
-        'ingredient_id': trial.ingredient_id,
-        'trial_date': trial.trial_date.isoformat(),
-        'trial_count': trial.trial_count,
-        'is_allergic': trial.is_allergic,
-        'reaction_level': trial.reaction_level,
-        'notes': trial.notes,
-        'created_at': trial.created_at.isoformat()
-    } for trial in trials]
+    return make_succ_response(FoodTrial.schema.dump_many(trials, _requested_fields(FoodTrial.schema)))
+
+
+@bp.route('/api/babies/<baby_id>/eligible-ingredients', methods=['GET'])
+def get_eligible_ingredients(baby_id):
+    """
+    获取宝宝当前可以吃的食材（适用于月龄，排除避免食材和有过敏记录的食材）
+    :param baby_id: 宝宝ID
+    :return: 月龄及食材列表
+    """
+    baby = query_baby_by_id(baby_id)
+    if baby is None:
+        return make_err_response('宝宝不存在')
     
-    return make_succ_response(trials_data)
+    on_date = date.today()
+    if request.args.get('date'):
+        try:
+            on_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+        except ValueError:
+            return make_err_response('日期格式错误')
+    
+    max_risk = request.args.get('max_risk') or None
+    if max_risk not in (None, 'low', 'medium', 'high'):
+        return make_err_response('max_risk参数无效')
+    
+    ingredients, age_months = query_eligible_ingredients(baby, on_date, request.args.get('category'), max_risk)
+    
+    return make_succ_response({
+        'age_months': age_months,
+        'ingredients': Ingredient.schema.dump_many(ingredients, _requested_fields(Ingredient.schema))
+    })
+
+
+@bp.route('/api/babies/<baby_id>/trial-summary', methods=['GET'])
+def get_trial_summary(baby_id):
+    """
+    获取宝宝的辅食添加进度：按食材汇总的尝试次数、首次/最近尝试日期、最重反应及是否过敏
+    :param baby_id: 宝宝ID
+    :return: 汇总列表（按最近尝试日期倒序）
+    """
+    summary = query_trial_summary(baby_id)
+    ingredients = query_ingredients_by_ids([item['ingredient_id'] for item in summary])
+    for item in summary:
+        ingredient = ingredients.get(item['ingredient_id'])
+        item['ingredient_name'] = ingredient.name if ingredient is not None else None
+        item['category'] = ingredient.category if ingredient is not None else None
+    
+    return make_succ_response(summary)
 
 
 # ==================== 食谱管理接口 ====================
-@app.route('/api/recipes', methods=['POST'])
+@bp.route('/api/recipes', methods=['POST'])
 def create_recipe():
     """
     创建食谱
@@ -714,20 +854,18 @@ def create_recipe():
     recipe.notes = params.get('notes', '')
     recipe.created_at = datetime.now()
     
-    insert_recipe(recipe)
+    if not insert_recipe(recipe):
+        return make_err_response('创建食谱失败，该日期的食谱可能已存在')
     
-    return make_succ_response({
-        'id': recipe.id,
-        'baby_id': recipe.baby_id,
-        'recipe_date': recipe.recipe_date.isoformat(),
-        'created_by': recipe.created_by,
-        'auto_generated': recipe.auto_generated,
-        'notes': recipe.notes,
-        'created_at': recipe.created_at.isoformat()
-    })
+    # 通知宝宝所在家庭的全部成员
+    if params.get('notify_family'):
+        insert_family_notifications(recipe.baby_id, 'recipe_update', '食谱已更新',
+                                    f'{recipe.recipe_date.isoformat()} 的食谱已更新')
+    
+    return make_succ_response(Recipe.schema.dump(recipe))
 
 
-@app.route('/api/recipes', methods=['GET'])
+@bp.route('/api/recipes', methods=['GET'])
 def get_recipes():
     """
     查询食谱（按宝宝ID和日期）
@@ -740,33 +878,19 @@ def get_recipes():
         return make_err_response('缺少baby_id或date参数')
     
     recipe_date_obj = datetime.strptime(recipe_date, '%Y-%m-%d').date()
-    recipe = query_recipe_by_baby_and_date(baby_id, recipe_date_obj)
+    recipe = query_recipe_with_items_by_baby_and_date(baby_id, recipe_date_obj)
     
     if recipe is None:
         return make_err_response('食谱不存在')
     
-    # 获取食谱项
-    items = query_recipe_items(recipe.id)
-    items_data = [{
-        'id': item.id,
-        'meal_type': item.meal_type,
-        'ingredients': item.ingredients,
-        'instructions': item.instructions
-    } for item in items]
+    # 食谱项已随食谱一并加载
+    recipe_data = Recipe.schema.dump(recipe)
+    recipe_data['items'] = RecipeItem.schema.dump_many(recipe.items, _RECIPE_ITEM_NESTED_FIELDS)
     
-    return make_succ_response({
-        'id': recipe.id,
-        'baby_id': recipe.baby_id,
-        'recipe_date': recipe.recipe_date.isoformat(),
-        'created_by': recipe.created_by,
-        'auto_generated': recipe.auto_generated,
-        'notes': recipe.notes,
-        'items': items_data,
-        'created_at': recipe.created_at.isoformat()
-    })
+    return make_succ_response(recipe_data)
 
 
-@app.route('/api/babies/<baby_id>/recipes', methods=['GET'])
+@bp.route('/api/babies/<baby_id>/recipes', methods=['GET'])
 def get_baby_recipes(baby_id):
     """
     获取宝宝的全部食谱记录
@@ -775,20 +899,113 @@ def get_baby_recipes(baby_id):
     """
     recipes = query_recipes_by_baby(baby_id)
     
-    recipes_data = [{
-        'id': recipe.id,
-        'baby_id': recipe.baby_id,
-        'recipe_date': recipe.recipe_date.isoformat(),
-        'created_by': recipe.created_by,
-        'auto_generated': recipe.auto_generated,
-        'notes': recipe.notes,
-        'created_at': recipe.created_at.isoformat()
-    } for recipe in recipes]
+    return make_succ_response(Recipe.schema.dump_many(recipes, _requested_fields(Recipe.schema)))
+
+
+@bp.route('/api/babies/<baby_id>/recipes/range', methods=['GET'])
+def get_baby_recipes_range(baby_id):
+    """
+    获取宝宝在日期范围内每天的食谱及餐次（周/月食谱日历）
+    :param baby_id: 宝宝ID
+    :return: 食谱列表
+    """
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    
+    if not date_from or not date_to:
+        return make_err_response('缺少from或to参数')
+    
+    try:
+        date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
+        date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
+    except ValueError:
+        return make_err_response('日期格式错误')
+    
+    if date_to_obj < date_from_obj:
+        return make_err_response('to不能早于from')
+    if (date_to_obj - date_from_obj).days > 92:
+        return make_err_response('日期范围不能超过92天')
+    
+    recipes = query_recipes_with_items_by_range(baby_id, date_from_obj, date_to_obj)
+    
+    fields = _requested_fields(Recipe.schema)
+    recipes_data = Recipe.schema.dump_many(recipes, fields)
+    for recipe, recipe_data in zip(recipes, recipes_data):
+        recipe_data['items'] = RecipeItem.schema.dump_many(recipe.items, _RECIPE_ITEM_NESTED_FIELDS)
     
     return make_succ_response(recipes_data)
 
 
-@app.route('/api/recipes/<recipe_id>', methods=['PATCH'])
+@bp.route('/api/babies/<baby_id>/recipes/generate', methods=['POST'])
+def generate_baby_recipes(baby_id):
+    """
+    为宝宝自动生成日期范围内每天的食谱及餐次
+    跳过已有食谱和生病的日期，食材从当天月龄可吃的食材中轮换选取，全部食谱在一个事务中写入
+    :param baby_id: 宝宝ID
+    :return: 生成的食谱列表及跳过的日期
+    """
+    params = request.get_json() or {}
+    
+    baby = query_baby_by_id(baby_id)
+    if baby is None:
+        return make_err_response('宝宝不存在')
+    
+    if not params.get('from') or not params.get('to'):
+        return make_err_response('缺少from或to参数')
+    
+    try:
+        date_from = datetime.strptime(params['from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(params['to'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return make_err_response('日期格式错误')
+    
+    if date_to < date_from:
+        return make_err_response('to不能早于from')
+    if (date_to - date_from).days >= _GENERATE_MAX_DAYS:
+        return make_err_response(f'单次最多生成{_GENERATE_MAX_DAYS}天的食谱')
+    
+    existing_dates = query_recipe_dates(baby_id, date_from, date_to)
+    if existing_dates is None:
+        return make_err_response('生成食谱失败')
+    
+    illness_dates = set()
+    for event in query_events_in_range(baby_id, date_from, date_to, 'illness'):
+        day = max(event.start_date, date_from)
+        while day <= min(event.end_date or event.start_date, date_to):
+            illness_dates.add(day)
+            day += timedelta(days=1)
+    
+    # 可吃的食材按月龄取一次（范围内最多跨两个月龄）
+    eligible_by_month = {}
+    day_ingredients, skipped = [], []
+    for offset in range((date_to - date_from).days + 1):
+        day = date_from + timedelta(days=offset)
+        if day in existing_dates:
+            skipped.append({'date': day, 'reason': 'exists'})
+            continue
+        if day in illness_dates:
+            skipped.append({'date': day, 'reason': 'illness'})
+            continue
+        month = age_in_months(baby.birth_date, day)
+        if month not in eligible_by_month:
+            eligible_by_month[month], _ = query_eligible_ingredients(baby, day)
+        if not eligible_by_month[month]:
+            skipped.append({'date': day, 'reason': 'no_ingredients'})
+            continue
+        day_ingredients.append((day, eligible_by_month[month]))
+    
+    recipes = plan_recipes(baby_id, day_ingredients, params.get('created_by'))
+    if recipes and not insert_recipes_with_items(recipes):
+        return make_err_response('生成食谱失败，部分日期的食谱可能已存在')
+    
+    recipes_data = Recipe.schema.dump_many(recipes)
+    for recipe, recipe_data in zip(recipes, recipes_data):
+        recipe_data['items'] = RecipeItem.schema.dump_many(recipe.items, _RECIPE_ITEM_NESTED_FIELDS)
+    
+    return make_succ_response({'recipes': recipes_data, 'skipped': skipped})
+
+
+@bp.route('/api/recipes/<recipe_id>', methods=['PATCH'])
 def update_recipe_info(recipe_id):
     """
     更新食谱备注
@@ -797,25 +1014,17 @@ def update_recipe_info(recipe_id):
     """
     params = request.get_json()
     
-    # 检查食谱是否存在
-    existing_recipe = query_recipe_by_id(recipe_id)
-    if existing_recipe is None:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_recipe = update_recipe(recipe_id, params)
+    if updated_recipe is None:
         return make_err_response('食谱不存在')
-    
-    # 更新食谱
-    success = update_recipe(recipe_id, params)
-    if not success:
+    if not updated_recipe:
         return make_err_response('更新食谱失败')
     
-    # 返回更新后的食谱信息
-    updated_recipe = query_recipe_by_id(recipe_id)
-    return make_succ_response({
-        'id': updated_recipe.id,
-        'notes': updated_recipe.notes
-    })
+    return make_succ_response(Recipe.schema.dump(updated_recipe, ('id', 'notes')))
 
 
-@app.route('/api/recipes/<recipe_id>', methods=['DELETE'])
+@bp.route('/api/recipes/<recipe_id>', methods=['DELETE'])
 def delete_recipe_info(recipe_id):
     """
     删除食谱
@@ -830,7 +1039,7 @@ def delete_recipe_info(recipe_id):
 
 
 # ==================== 食谱项接口 ====================
-@app.route('/api/recipes/<recipe_id>/items', methods=['POST'])
+@bp.route('/api/recipes/<recipe_id>/items', methods=['POST'])
 def create_recipe_item(recipe_id):
     """
     添加食谱项（餐次）
@@ -839,36 +1048,57 @@ def create_recipe_item(recipe_id):
     """
     params = request.get_json()
     
-    if 'meal_type' not in params:
-        return make_err_response('缺少meal_type参数')
+    item, error = _build_recipe_item(recipe_id, params)
+    if error:
+        return make_err_response(error)
     
     # 检查食谱是否存在
     recipe = query_recipe_by_id(recipe_id)
     if recipe is None:
         return make_err_response('食谱不存在')
     
-    # 创建食谱项
-    item = RecipeItem()
-    item.id = str(uuid.uuid4())
-    item.recipe_id = recipe_id
-    item.meal_type = params['meal_type']
-    item.ingredients = params.get('ingredients', [])
-    item.instructions = params.get('instructions', '')
-    item.created_at = datetime.now()
-    
     insert_recipe_item(item)
     
-    return make_succ_response({
-        'id': item.id,
-        'recipe_id': item.recipe_id,
-        'meal_type': item.meal_type,
-        'ingredients': item.ingredients,
-        'instructions': item.instructions,
-        'created_at': item.created_at.isoformat()
-    })
+    return make_succ_response(RecipeItem.schema.dump(item))
 
 
-@app.route('/api/recipes/<recipe_id>/items', methods=['GET'])
+@bp.route('/api/recipes/<recipe_id>/items/batch', methods=['POST'])
+def create_recipe_items_batch(recipe_id):
+    """
+    批量添加食谱项（校验通过的食谱项在一个事务中写入）
+    :param recipe_id: 食谱ID
+    :return: 与请求顺序一致的逐条结果
+    """
+    items, results, error = _build_batch(lambda params: _build_recipe_item(recipe_id, params))
+    if error:
+        return make_err_response(error)
+    
+    # 检查食谱是否存在
+    recipe = query_recipe_by_id(recipe_id)
+    if recipe is None:
+        return make_err_response('食谱不存在')
+    
+    # 每份食谱每个餐别只能有一项（uniq_recipe_meal），与已有餐次或本批次中前面的记录重复时返回错误
+    existing = {item.meal_type for item in query_recipe_items(recipe_id)}
+    seen = set()
+    
+    def check_meal_type(item):
+        if item.meal_type in existing:
+            return '该餐别已存在'
+        if item.meal_type in seen:
+            return 'meal_type重复'
+        seen.add(item.meal_type)
+        return None
+    
+    items = _check_batch(results, check_meal_type)
+    
+    if items and not insert_recipe_items(items):
+        return make_err_response('批量添加食谱项失败')
+    
+    return make_succ_response(_batch_results(results, RecipeItem.schema))
+
+
+@bp.route('/api/recipes/<recipe_id>/items', methods=['GET'])
 def get_recipe_items(recipe_id):
     """
     获取食谱下的所有餐次
@@ -877,19 +1107,10 @@ def get_recipe_items(recipe_id):
     """
     items = query_recipe_items(recipe_id)
     
-    items_data = [{
-        'id': item.id,
-        'recipe_id': item.recipe_id,
-        'meal_type': item.meal_type,
-        'ingredients': item.ingredients,
-        'instructions': item.instructions,
-        'created_at': item.created_at.isoformat()
-    } for item in items]
-    
-    return make_succ_response(items_data)
+    return make_succ_response(RecipeItem.schema.dump_many(items, _requested_fields(RecipeItem.schema)))
 
 
-@app.route('/api/recipe-items/<item_id>', methods=['PATCH'])
+@bp.route('/api/recipe-items/<item_id>', methods=['PATCH'])
 def update_recipe_item_info(item_id):
     """
     修改餐次内容
@@ -898,28 +1119,17 @@ def update_recipe_item_info(item_id):
     """
     params = request.get_json()
     
-    # 检查食谱项是否存在
-    existing_item = query_recipe_item_by_id(item_id)
-    if existing_item is None:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_item = update_recipe_item(item_id, params)
+    if updated_item is None:
         return make_err_response('食谱项不存在')
-    
-    # 更新食谱项
-    success = update_recipe_item(item_id, params)
-    if not success:
+    if not updated_item:
         return make_err_response('更新食谱项失败')
     
-    # 返回更新后的食谱项信息
-    updated_item = query_recipe_item_by_id(item_id)
-    return make_succ_response({
-        'id': updated_item.id,
-        'recipe_id': updated_item.recipe_id,
-        'meal_type': updated_item.meal_type,
-        'ingredients': updated_item.ingredients,
-        'instructions': updated_item.instructions
-    })
+    return make_succ_response(RecipeItem.schema.dump(updated_item, _RECIPE_ITEM_UPDATE_FIELDS))
 
 
-@app.route('/api/recipe-items/<item_id>', methods=['DELETE'])
+@bp.route('/api/recipe-items/<item_id>', methods=['DELETE'])
 def delete_recipe_item_info(item_id):
     """
     删除餐次
@@ -934,7 +1144,7 @@ def delete_recipe_item_info(item_id):
 
 
 # ==================== 特殊事件接口 ====================
-@app.route('/api/events', methods=['POST'])
+@bp.route('/api/events', methods=['POST'])
 def create_event():
     """
     添加事件
@@ -942,35 +1152,38 @@ def create_event():
     """
     params = request.get_json()
     
-    required_fields = ['baby_id', 'event_type', 'start_date']
-    for field in required_fields:
-        if field not in params:
-            return make_err_response(f'缺少必需参数: {field}')
-    
-    # 创建事件
-    event = Event()
-    event.id = str(uuid.uuid4())
-    event.baby_id = params['baby_id']
-    event.event_type = params['event_type']
-    event.start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
-    event.end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date() if 'end_date' in params else None
-    event.description = params.get('description', '')
-    event.created_at = datetime.now()
+    event, error = _build_event(params)
+    if error:
+        return make_err_response(error)
     
     insert_event(event)
     
-    return make_succ_response({
-        'id': event.id,
-        'baby_id': event.baby_id,
-        'event_type': event.event_type,
-        'start_date': event.start_date.isoformat(),
-        'end_date': event.end_date.isoformat() if event.end_date else None,
-        'description': event.description,
-        'created_at': event.created_at.isoformat()
-    })
+    return make_succ_response(Event.schema.dump(event))
 
 
-@app.route('/api/babies/<baby_id>/events', methods=['GET'])
+@bp.route('/api/events/batch', methods=['POST'])
+def create_events_batch():
+    """
+    批量添加事件（校验通过的事件在一个事务中写入）
+    :return: 与请求顺序一致的逐条结果
+    """
+    events, results, error = _build_batch(_build_event)
+    if error:
+        return make_err_response(error)
+    
+    # 一次查询所有引用的宝宝，不存在的记录单独返回错误
+    baby_ids = query_existing_baby_ids({event.baby_id for event in events})
+    if baby_ids is None:
+        return make_err_response('批量添加事件失败')
+    events = _check_batch(results, lambda event: None if event.baby_id in baby_ids else '宝宝不存在')
+    
+    if events and not insert_events(events):
+        return make_err_response('批量添加事件失败')
+    
+    return make_succ_response(_batch_results(results, Event.schema))
+
+
+@bp.route('/api/babies/<baby_id>/events', methods=['GET'])
 def get_baby_events(baby_id):
     """
     查看宝宝的所有事件
@@ -979,20 +1192,10 @@ def get_baby_events(baby_id):
     """
     events = query_events_by_baby(baby_id)
     
-    events_data = [{
-        'id': event.id,
-        'baby_id': event.baby_id,
-        'event_type': event.event_type,
-        'start_date': event.start_date.isoformat(),
-        'end_date': event.end_date.isoformat() if event.end_date else None,
-        'description': event.description,
-        'created_at': event.created_at.isoformat()
-    } for event in events]
-    
-    return make_succ_response(events_data)
+    return make_succ_response(Event.schema.dump_many(events, _requested_fields(Event.schema)))
 
 
-@app.route('/api/events/<event_id>', methods=['PATCH'])
+@bp.route('/api/events/<event_id>', methods=['PATCH'])
 def update_event_info(event_id):
     """
     修改事件信息
@@ -1001,35 +1204,23 @@ def update_event_info(event_id):
     """
     params = request.get_json()
     
-    # 检查事件是否存在
-    existing_event = query_event_by_id(event_id)
-    if existing_event is None:
-        return make_err_response('事件不存在')
-    
     # 处理日期格式
     if 'start_date' in params:
         params['start_date'] = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
     if 'end_date' in params:
         params['end_date'] = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
     
-    # 更新事件
-    success = update_event(event_id, params)
-    if not success:
+    # 单条UPDATE更新，并直接用返回的实体构造响应
+    updated_event = update_event(event_id, params)
+    if updated_event is None:
+        return make_err_response('事件不存在')
+    if not updated_event:
         return make_err_response('更新事件失败')
     
-    # 返回更新后的事件信息
-    updated_event = query_event_by_id(event_id)
-    return make_succ_response({
-        'id': updated_event.id,
-        'baby_id': updated_event.baby_id,
-        'event_type': updated_event.event_type,
-        'start_date': updated_event.start_date.isoformat(),
-        'end_date': updated_event.end_date.isoformat() if updated_event.end_date else None,
-        'description': updated_event.description
-    })
+    return make_succ_response(Event.schema.dump(updated_event, _EVENT_UPDATE_FIELDS))
 
 
-@app.route('/api/events/<event_id>', methods=['DELETE'])
+@bp.route('/api/events/<event_id>', methods=['DELETE'])
 def delete_event_info(event_id):
     """
     删除事件
@@ -1044,33 +1235,83 @@ def delete_event_info(event_id):
 
 
 # ==================== 通知接口 ====================
-@app.route('/api/users/<user_id>/notifications', methods=['GET'])
+@bp.route('/api/users/<user_id>/notifications', methods=['GET'])
 def get_user_notifications(user_id):
     """
     获取用户通知列表
+    传入limit、after或since任一参数时使用游标分页（按创建时间倒序），否则返回全部通知
     :param user_id: 用户ID
     :return: 通知列表
     """
     is_read = request.args.get('is_read', None)
     if is_read is not None:
         is_read = is_read.lower() == 'true'
+    fields = _requested_fields(Notification.schema)
+    
+    if not any(name in request.args for name in ('limit', 'after', 'since')):
+        notifications = query_notifications_by_user(user_id, is_read)
+        return make_succ_response(Notification.schema.dump_many(notifications, fields))
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), _PAGE_SIZE_MAX)
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        after = None
+        if request.args.get('after'):
+            after = decode_cursor(request.args['after'], (str, str))
+            if after is None:
+                return make_err_response('after参数无效')
+            after = (datetime.fromisoformat(after[0]), after[1])
+    except (TypeError, ValueError):
+        return make_err_response('since或after参数无效')
+    
+    notifications, next_after = query_notifications_page(user_id, is_read, after, since, limit)
+    
+    return make_succ_response({
+        'notifications': Notification.schema.dump_many(notifications, fields),
+        'next_cursor': encode_cursor([next_after[0].isoformat(), next_after[1]]) if next_after else None
+    })
+
+
+@bp.route('/api/babies/<baby_id>/notifications', methods=['POST'])
+def notify_baby_family(baby_id):
+    """
+    向宝宝所在家庭的全部成员发送通知
+    :param baby_id: 宝宝ID
+    :return: 发送的通知数
+    """
+    params = request.get_json()
     
-    notifications = query_notifications_by_user(user_id, is_read)
+    required_fields = ['type', 'title']
+    for field in required_fields:
+        if field not in params:
+            return make_err_response(f'缺少必需参数: {field}')
+    
+    if params['type'] not in ('trial_reminder', 'recipe_update', 'event_alert'):
+        return make_err_response('通知类型无效')
+    
+    # 宝宝不存在与家庭暂无成员（count为0）需要区分
+    if query_baby_by_id(baby_id) is None:
+        return make_err_response('宝宝不存在')
     
-    notifications_data = [{
-        'id': notification.id,
-        'user_id': notification.user_id,
-        'type': notification.type,
-        'title': notification.title,
-        'message': notification.message,
-        'is_read': notification.is_read,
-        'created_at': notification.created_at.isoformat()
-    } for notification in notifications]
+    count = insert_family_notifications(baby_id, params['type'], params['title'], params.get('message', ''))
+    if count is None:
+        return make_err_response('发送通知失败')
     
-    return make_succ_response(notifications_data)
+    return make_succ_response({'count': count})
 
 
-@app.route('/api/notifications/<notification_id>/read', methods=['PATCH'])
+@bp.route('/api/users/<user_id>/notifications/unread-count', methods=['GET'])
+def get_unread_notification_count(user_id):
+    """
+    获取用户未读通知数（读取维护好的计数，用于角标轮询）
+    :param user_id: 用户ID
+    :return: 未读通知数
+    """
+    return make_succ_response({'unread_count': query_unread_count(user_id)})
+
+
+@bp.route('/api/notifications/<notification_id>/read', methods=['PATCH'])
 def mark_notification_as_read(notification_id):
     """
     标记通知为已读
@@ -1084,7 +1325,7 @@ def mark_notification_as_read(notification_id):
     return make_succ_empty_response()
 
 
-@app.route('/api/users/<user_id>/notifications/read-all', methods=['PATCH'])
+@bp.route('/api/users/<user_id>/notifications/read-all', methods=['PATCH'])
 def mark_all_notifications_as_read(user_id):
     """
     标记用户所有通知为已读
@@ -1096,3 +1337,19 @@ def mark_all_notifications_as_read(user_id):
         return make_err_response('标记失败')
     
     return make_succ_empty_response()
+
+
+# ==================== 运维接口 ====================
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    输出运行指标（Prometheus文本格式，多worker时为所有worker的汇总）
+    未配置 METRICS_TOKEN 时不开放，请求头需带 Authorization: Bearer <令牌>
+    :return: 指标文本
+    """
+    if not config.METRICS_TOKEN:
+        abort(404)
+    expected = 'Bearer {}'.format(config.METRICS_TOKEN)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'), expected.encode('utf-8')):
+        abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+
+import config
+
+# 初始化日志
+logger = logging.getLogger('log')
+
+
+# ==================== 异常定义 ====================
+class WechatError(Exception):
+    """
+    调用微信接口失败
+    """
+
+
+class WechatTimeoutError(WechatError):
+    """
+    调用微信接口超时
+    """
+
+
+class WechatUnavailableError(WechatError):
+    """
+    微信接口连续失败，熔断中
+    """
+
+
+# ==================== 熔断器 ====================
+class CircuitBreaker(object):
+    """
+    简单熔断器：连续失败达到阈值后熔断，熔断期间直接拒绝请求；
+    熔断时间结束后放行一个试探请求，成功则恢复，失败则继续熔断
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def allow(self):
+        """
+        判断当前是否允许发起请求
+        :return: (是否允许, 本次请求是否为试探请求)，试探请求结束后须调用 end_probe
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False, False
+            self._probing = True
+            return True, True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def end_probe(self):
+        """
+        结束试探请求（无论结果如何），只能由 allow 放行的试探请求调用，
+        避免意外异常导致熔断器一直处于试探中而拒绝全部请求
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_breaker = CircuitBreaker(config.WECHAT_BREAKER_FAILURES, config.WECHAT_BREAKER_RESET)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """
+    创建带连接池和重试策略的HTTP会话
+    """
+    # requests 导入较慢，推迟到首次调用微信接口时再导入，缩短冷启动时间
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # 只重试连接失败和5xx：jscode2session 的 code 只能使用一次，
+    # 读超时时微信可能已消费 code，重试只会得到 code been used 错误
+    retry = Retry(
+        total=config.WECHAT_MAX_RETRIES,
+        connect=config.WECHAT_MAX_RETRIES,
+        read=0,
+        status=config.WECHAT_MAX_RETRIES,
+        backoff_factor=config.WECHAT_RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.WECHAT_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.verify = config.WECHAT_VERIFY_SSL
+    return session
+
+
+def get_session():
+    """
+    获取进程内共享的HTTP会话（keep-alive连接复用）
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _get(path, params):
+    """
+    调用微信GET接口
+    :param path: 接口路径
+    :param params: 查询参数
+    :return: 接口返回的JSON数据
+    """
+    allowed, probe = _breaker.allow()
+    if not allowed:
+        raise WechatUnavailableError('微信接口暂时不可用')
+
+    try:
+        session = get_session()
+        from requests.exceptions import RequestException, Timeout
+
+        url = config.WECHAT_API_BASE.rstrip('/') + path
+        try:
+            response = session.get(url, params=params,
+                                   timeout=(config.WECHAT_CONNECT_TIMEOUT, config.WECHAT_READ_TIMEOUT))
+        except Timeout as e:
+            _breaker.record_failure()
+            logger.info("wechat {} timeout errorMsg= {} ".format(path, e))
+            raise WechatTimeoutError(str(e))
+        except RequestException as e:
+            _breaker.record_failure()
+            logger.info("wechat {} errorMsg= {} ".format(path, e))
+            raise WechatError(str(e))
+
+        if response.status_code >= 500:
+            _breaker.record_failure()
+            raise WechatError('HTTP {}'.format(response.status_code))
+        _breaker.record_success()
+
+        try:
+            return response.json()
+        except ValueError:
+            raise WechatError('微信接口返回格式错误')
+    finally:
+        if probe:
+            _breaker.end_probe()
+
+
+def code2session(code):
+    """
+    小程序登录凭证校验（jscode2session）
+    :param code: wx.login 获取的临时登录凭证
+    :return: 微信接口返回的JSON数据（openid、session_key 或 errcode、errmsg）
+    """
+    return _get('/sns/jscode2session', {
+        'appid': config.WECHAT_APPID,
+        'secret': config.WECHAT_SECRET,
+        'js_code': code,
+        'grant_type': 'authorization_code'
+    })